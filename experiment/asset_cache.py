@@ -0,0 +1,189 @@
+# asset_cache.py - In-memory, precompressed cache of small static files
+import gzip
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from email.utils import formatdate
+
+try:
+    import brotli  # Optional: enables the 'br' variant
+except ImportError:
+    brotli = None
+
+# Content types worth compressing; images and video already are
+COMPRESSIBLE_TYPES = (
+    'text/',
+    'application/javascript',
+    'application/json',
+    'application/xml',
+    'image/svg+xml',
+)
+
+# What warm() preloads: files with these extensions at the top of the site,
+# plus everything with them under these subdirectories
+WARM_DIRS = ('static', 'assets')
+WARM_EXTENSIONS = frozenset((
+    '.html', '.htm', '.js', '.mjs', '.css', '.json', '.map', '.svg', '.txt',
+    '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico', '.woff', '.woff2',
+))
+
+Asset = namedtuple('Asset', ['mtime_ns', 'size', 'content_type', 'last_modified', 'variants', 'nbytes'])
+
+
+def negotiate_encoding(accept_encoding, available):
+    """
+    Pick the best of the available encodings for an Accept-Encoding header.
+
+    Honors q-values (q=0 rules an encoding out) and prefers br over gzip
+    over identity when the client weights them equally.
+    """
+    preference = ['br', 'gzip', 'identity']
+    weights = {}
+    for part in (accept_encoding or '').split(','):
+        fields = part.strip().split(';')
+        coding = fields[0].strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in fields[1:]:
+            name, _, value = param.strip().partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+
+    wildcard = weights.get('*')
+    candidates = []
+    for rank, coding in enumerate(preference):
+        if coding not in available and coding != 'identity':
+            continue
+        default = 1.0 if coding == 'identity' else 0.0
+        q = weights.get(coding, default if wildcard is None else wildcard)
+        if q > 0:
+            candidates.append((q, -rank, coding))
+    # Nothing acceptable: identity is still the only thing we can send
+    return max(candidates)[2] if candidates else 'identity'
+
+
+class AssetCache:
+    """
+    Keeps small files in memory as raw bytes plus gzip (and brotli, when the
+    brotli package is installed) variants.
+
+    Entries are checked against the file's mtime and size on every lookup
+    and reloaded when they change. Files over max_file_size are never
+    cached, so large media stays on the sendfile path, and the total size
+    of all variants is held under max_bytes by evicting the least recently
+    used files.
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, max_file_size=1024 * 1024,
+                 compress_min_size=512):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.compress_min_size = compress_min_size
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, path, content_type):
+        """Return the Asset for path, loading it if needed, or None if it can't be cached"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_size > self.max_file_size:
+            return None
+
+        with self._lock:
+            asset = self._entries.get(path)
+            if asset is not None and asset.mtime_ns == st.st_mtime_ns and asset.size == st.st_size:
+                self._entries.move_to_end(path)
+                self.hits += 1
+                return asset
+            self.misses += 1
+
+        asset = self._load(path, content_type)
+        if asset is None:
+            return None
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.nbytes -= old.nbytes
+            self._entries[path] = asset
+            self.nbytes += asset.nbytes
+            while self.nbytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+        return asset
+
+    def _load(self, path, content_type):
+        try:
+            with open(path, 'rb') as f:
+                st = os.fstat(f.fileno())
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) > self.max_file_size:
+            return None
+
+        variants = {'identity': data}
+        if len(data) >= self.compress_min_size and content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(compressed) < len(data):
+                variants['gzip'] = compressed
+            if brotli is not None:
+                compressed = brotli.compress(data)
+                if len(compressed) < len(data):
+                    variants['br'] = compressed
+
+        return Asset(
+            mtime_ns=st.st_mtime_ns,
+            size=st.st_size,
+            content_type=content_type,
+            last_modified=formatdate(st.st_mtime, usegmt=True),
+            variants=variants,
+            nbytes=sum(len(v) for v in variants.values()),
+        )
+
+    def warm(self, directory, guess_type, subdirs=WARM_DIRS, extensions=WARM_EXTENSIONS):
+        """
+        Preload a site's web assets until the cache is full: files with one
+        of extensions directly in directory, and anywhere below its subdirs.
+        Nothing else is walked, so starting the server from a repo root or
+        home directory doesn't read venvs, datasets or .git.
+        """
+        def walk():
+            for entry in os.scandir(directory):
+                if entry.is_file():
+                    yield entry.path
+            for subdir in subdirs:
+                for root, dirs, files in os.walk(os.path.join(directory, subdir)):
+                    dirs[:] = [d for d in dirs if not d.startswith('.')]
+                    for name in files:
+                        yield os.path.join(root, name)
+
+        for path in walk():
+            if self.nbytes >= self.max_bytes:
+                return
+            if os.path.splitext(path)[1].lower() not in extensions:
+                continue
+            try:
+                if os.path.getsize(path) > self.max_file_size:
+                    continue
+            except OSError:
+                continue
+            self.get(path, guess_type(path))
+
+    @staticmethod
+    def etag(asset, encoding):
+        """Strong ETag, distinct per encoding since each is its own representation"""
+        suffix = '' if encoding == 'identity' else f'-{encoding}'
+        return f'"{asset.mtime_ns:x}-{asset.size:x}{suffix}"'
@@ -0,0 +1,77 @@
+# asset_pipeline.py - Minify and fingerprint the simulator's static files
+import hashlib
+import os
+import re
+
+# Trailing "  // comment" on a line of code. Only stripped from lines with no
+# string literals, so a '//' inside a URL or message is never touched.
+JS_TRAILING_COMMENT_RE = re.compile(r'\s+//.*$')
+CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+CSS_SPACE_RE = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(source):
+    """
+    Strip comments and collapse whitespace in a stylesheet.
+
+    Spaces are only dropped around characters where they never matter
+    ({ } ; , >) and after colons, so selectors like 'a :hover' keep their
+    meaning.
+    """
+    css = CSS_COMMENT_RE.sub('', source)
+    css = re.sub(r'\s+', ' ', css)
+    css = CSS_SPACE_RE.sub(r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    css = css.replace(';}', '}')
+    return css.strip()
+
+
+def minify_js(source):
+    """
+    Conservative, line-based JavaScript minifier.
+
+    Drops indentation, blank lines and comment-only lines, plus trailing
+    comments on lines without string literals. Line breaks are kept so
+    automatic semicolon insertion behaves exactly as in the source.
+    """
+    lines = []
+    for line in source.splitlines():
+        line = line.strip()
+        if not line or line.startswith('//'):
+            continue
+        if not any(quote in line for quote in ('"', "'", '`')):
+            line = JS_TRAILING_COMMENT_RE.sub('', line)
+        lines.append(line)
+    return '\n'.join(lines) + '\n'
+
+
+def fingerprint(filename, content, directory='dist'):
+    """
+    Return the content-hashed path for a file, e.g. 'dist/app.3f2c9a1b04.js'.
+
+    The hash covers the content, so a new build gets a new name and the
+    old one can be cached forever.
+    """
+    digest = hashlib.sha256(content.encode('utf-8')).hexdigest()[:10]
+    stem, ext = os.path.splitext(filename)
+    return f"{directory}/{stem}.{digest}{ext}"
+
+
+def build_pipeline(sources):
+    """
+    Minify and fingerprint static files.
+
+    sources maps a static filename ('app.js') to its source text. Returns
+    (manifest, outputs): manifest maps each filename to its fingerprinted
+    path relative to the static folder, and outputs maps that path to the
+    minified content.
+    """
+    minifiers = {'.css': minify_css, '.js': minify_js}
+    manifest, outputs = {}, {}
+    for filename, source in sources.items():
+        minify = minifiers.get(os.path.splitext(filename)[1], lambda text: text)
+        content = minify(source)
+        hashed = fingerprint(filename, content)
+        manifest[filename] = hashed
+        outputs[hashed] = content
+    return manifest, outputs
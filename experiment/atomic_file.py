@@ -0,0 +1,30 @@
+# atomic_file.py - Replace files atomically, so readers never see a partial write
+import contextlib
+import os
+import tempfile
+
+# mkstemp creates files readable only by their owner; what we publish gets the
+# usual mode instead. Fixed rather than umask-derived, since reading the umask
+# means setting it for the whole process.
+FILE_MODE = 0o644
+
+
+@contextlib.contextmanager
+def atomic_write(path, mode='wb', encoding=None):
+    """
+    Open a temp file next to path for writing; when the block exits cleanly
+    it gets FILE_MODE and is renamed over path, otherwise it's deleted.
+
+    The temp name is unique (and hidden), so concurrent writers of the same
+    path never share one; the last rename wins.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, encoding=encoding) as f:
+            yield f
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
@@ -0,0 +1,74 @@
+# bench_startup.py - Measure how long importing project.py takes
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import project
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Runs in a fresh interpreter so every sample pays the full import cost
+IMPORT_SNIPPET = (
+    "import sys, time; sys.path.insert(0, {base!r}); "
+    "t = time.perf_counter(); import project; "
+    "print(time.perf_counter() - t)"
+)
+
+
+def asset_mtimes():
+    return {
+        path: os.stat(os.path.join(BASE_DIR, path)).st_mtime_ns
+        for path in project.ASSETS
+    }
+
+
+def time_import(runs, skip_build=False):
+    """Import project.py in `runs` fresh interpreters and return the timings in seconds"""
+    env = dict(os.environ)
+    if skip_build:
+        env['AR_SKIP_ASSET_BUILD'] = '1'
+    else:
+        env.pop('AR_SKIP_ASSET_BUILD', None)
+
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_SNIPPET.format(base=BASE_DIR)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def report(label, timings):
+    ms = [t * 1000 for t in timings]
+    print(f"{label:<28} min {min(ms):7.2f} ms   median {statistics.median(ms):7.2f} ms   "
+          f"max {max(ms):7.2f} ms   (n={len(ms)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark project.py import time')
+    parser.add_argument('--runs', type=int, default=10, help='Imports per scenario')
+    args = parser.parse_args()
+
+    # Make sure the assets are current so the first measured import is a no-op
+    project.build_assets()
+    before = asset_mtimes()
+
+    report("import (asset check)", time_import(args.runs))
+    report("import (AR_SKIP_ASSET_BUILD)", time_import(args.runs, skip_build=True))
+
+    # Importing again must not touch the files
+    after = asset_mtimes()
+    rewritten = [path for path in before if before[path] != after[path]]
+    if rewritten:
+        print(f"FAIL: import rewrote unchanged assets: {', '.join(rewritten)}")
+        sys.exit(1)
+    print(f"OK: {len(before)} assets left untouched across {args.runs} imports")
+
+
+if __name__ == "__main__":
+    main()
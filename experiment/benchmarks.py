@@ -0,0 +1,218 @@
+# benchmarks.py - Microbenchmarks for the geo, QR and point-generation hot paths
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import platform
+import statistics
+import tempfile
+import timeit
+import tracemalloc
+from collections import namedtuple
+
+import numpy as np
+
+# Benchmarks measure code, not the asset writer
+os.environ.setdefault('AR_SKIP_ASSET_BUILD', '1')
+
+SEED = 1234
+
+# Scratch space for benchmarks that write files, removed at exit
+WORK_DIR = tempfile.TemporaryDirectory(prefix='ar-bench-')
+
+Benchmark = namedtuple('Benchmark', ['name', 'setup'])
+
+
+def bench_generate_nav_points(n):
+    def setup():
+        from poi_generator import generate_nav_points
+        return lambda: generate_nav_points(n, seed=SEED)
+    return Benchmark(f'generate_nav_points[{n}]', setup)
+
+
+def bench_get_navigation_points(n):
+    """Full /navigation-points request with an empty response cache"""
+    def setup():
+        import project
+        from poi_generator import generate_nav_points
+        from poi_loader import build_dataset
+
+        project.swap_dataset(build_dataset(generate_nav_points(n, seed=SEED)))
+        client = project.app.test_client()
+
+        def run():
+            project.RESPONSE_CACHE.clear()
+            response = client.get('/navigation-points')
+            assert response.status_code == 200
+        return run
+    return Benchmark(f'get_navigation_points[{n}]', setup)
+
+
+def bench_create_custom_qr(size):
+    def setup():
+        import generate_qr
+
+        output_file = os.path.join(WORK_DIR.name, f'marker-{size}.png')
+
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                generate_qr.create_custom_qr('1', output_file, size)
+        return run
+    return Benchmark(f'create_custom_qr[{size}px]', setup)
+
+
+def bench_geo(function_name, n):
+    def setup():
+        import geo
+
+        rng = np.random.default_rng(SEED)
+        lats = 37.7749 + rng.uniform(-0.5, 0.5, n)
+        lngs = -122.4194 + rng.uniform(-0.5, 0.5, n)
+        function = getattr(geo, function_name)
+        return lambda: function(37.7749, -122.4194, lats, lngs)
+    return Benchmark(f'{function_name}[{n}]', setup)
+
+
+def bench_route(n, landmarks):
+    """One uncached A* query between random points of an n-point graph over a 5 km disc"""
+    def setup():
+        from poi_generator import generate_nav_points
+        from routing import RouteGraph
+
+        points = generate_nav_points(n, radius=5000.0, seed=SEED)
+        graph = RouteGraph(points.lats, points.lngs, landmarks=landmarks)
+        pairs = np.random.default_rng(SEED).integers(0, n, size=(64, 2)).tolist()
+        queries = itertools.cycle(pairs)
+        return lambda: graph.shortest_path(*next(queries))
+    return Benchmark(f'route[{n},landmarks={landmarks}]', setup)
+
+
+def bench_request_metrics():
+    """Cost metrics add to every request: one started()/finished() pair"""
+    def setup():
+        from metrics import Registry, RequestMetrics
+
+        metrics = RequestMetrics(Registry(), 'bench')
+
+        def run():
+            metrics.started()
+            metrics.finished('/navigation-points', 'GET', 200, 0.004, 2048)
+        return run
+    return Benchmark('RequestMetrics.record', setup)
+
+
+BENCHMARKS = (
+    [bench_generate_nav_points(n) for n in (1_000, 100_000, 1_000_000)]
+    + [bench_get_navigation_points(n) for n in (10, 1_000, 10_000)]
+    + [bench_create_custom_qr(size) for size in (200, 400, 800)]
+    + [bench_geo(name, n) for name in ('haversine_m', 'initial_bearing_deg', 'equirectangular')
+       for n in (1_000, 100_000, 1_000_000)]
+    + [bench_route(n, landmarks) for n in (1_000, 20_000) for landmarks in (0, 8)]
+    + [bench_request_metrics()]
+)
+
+
+def measure(benchmark, repeat=7, warmup=1, min_time=0.2):
+    """
+    Time one benchmark and return a result dict.
+
+    After `warmup` untimed calls the loop count is calibrated so a sample
+    takes at least min_time seconds, then `repeat` samples are taken. The
+    median per-call time is the headline number; the interquartile range
+    shows the spread. Peak memory is measured on a separate call with
+    tracemalloc running, since tracing slows everything down.
+    """
+    run = benchmark.setup()
+    for _ in range(warmup):
+        run()
+
+    timer = timeit.Timer(run)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    samples = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    quartiles = statistics.quantiles(samples, n=4, method='inclusive')
+
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'name': benchmark.name,
+        'median_s': statistics.median(samples),
+        'iqr_s': quartiles[2] - quartiles[0],
+        'min_s': min(samples),
+        'stdev_s': statistics.stdev(samples),
+        'loops': number,
+        'repeat': repeat,
+        'peak_bytes': peak,
+    }
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return f'{seconds / scale:.3g} {unit}'
+    return f'{seconds / 1e-9:.3g} ns'
+
+
+def format_bytes(n):
+    for unit in ('B', 'KB', 'MB'):
+        if n < 1024:
+            return f'{n:.0f} {unit}'
+        n /= 1024
+    return f'{n:.1f} GB'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the microbenchmark suite')
+    parser.add_argument('-k', '--filter', default='', help='Only run benchmarks whose name contains this')
+    parser.add_argument('--repeat', type=int, default=7, help='Timed samples per benchmark')
+    parser.add_argument('--warmup', type=int, default=1, help='Untimed calls before sampling')
+    parser.add_argument('--min-time', type=float, default=0.2, help='Minimum seconds per sample')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Show the change against a previous --output file')
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {r['name']: r for r in json.load(f)['results']}
+
+    selected = [b for b in BENCHMARKS if args.filter in b.name]
+    if not selected:
+        parser.error(f"No benchmark matches '{args.filter}'")
+
+    print(f"{'benchmark':<34}{'median':>11}{'IQR':>11}{'min':>11}{'peak mem':>11}"
+          + (f"{'change':>9}" if baseline else ''))
+    results = []
+    for benchmark in selected:
+        result = measure(benchmark, args.repeat, args.warmup, args.min_time)
+        results.append(result)
+        line = (f"{result['name']:<34}{format_time(result['median_s']):>11}"
+                f"{format_time(result['iqr_s']):>11}{format_time(result['min_s']):>11}"
+                f"{format_bytes(result['peak_bytes']):>11}")
+        before = baseline.get(result['name'])
+        if before:
+            line += f"{result['median_s'] / before['median_s'] - 1:>+9.1%}"
+        print(line, flush=True)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'platform': platform.platform(),
+                'seed': SEED,
+                'results': results,
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
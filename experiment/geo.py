@@ -0,0 +1,90 @@
+# geo.py - Vectorized geodesy helpers shared by the navigation API
+import numpy as np
+
+EARTH_RADIUS_M = 6371e3  # Same mean radius the frontend uses
+METERS_PER_DEG_LAT = 111320.0
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    """
+    Great-circle distance in meters between two points or arrays of points.
+
+    Any argument may be a scalar or a NumPy array; the usual broadcasting
+    rules apply, so one origin can be compared against thousands of points
+    in a single call.
+    """
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = np.radians(np.asarray(lng2) - np.asarray(lng1))
+
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def degree_span(lat, radius_m):
+    """
+    Return (dlat, dlng) in degrees that covers radius_m around a latitude.
+
+    Used to turn a metric search radius into a bounding box for the grid
+    lookup. Close to the poles the longitude span grows without bound, so it
+    is capped at the full 360 degrees.
+    """
+    dlat = radius_m / METERS_PER_DEG_LAT
+    cos_lat = np.cos(np.radians(min(abs(lat) + dlat, 90.0)))
+    if cos_lat < 1e-9:
+        return dlat, 360.0
+    return dlat, min(360.0, radius_m / (METERS_PER_DEG_LAT * cos_lat))
+
+
+def initial_bearing_deg(lat1, lng1, lat2, lng2):
+    """
+    Initial great-circle bearing in degrees (0 = North, clockwise) from
+    point 1 to point 2. Accepts scalars or arrays like haversine_m.
+    """
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dlmb = np.radians(np.asarray(lng2) - np.asarray(lng1))
+
+    y = np.sin(dlmb) * np.cos(phi2)
+    x = np.cos(phi1) * np.sin(phi2) - np.sin(phi1) * np.cos(phi2) * np.cos(dlmb)
+    return np.degrees(np.arctan2(y, x)) % 360.0
+
+
+def destination_point(lat, lng, bearing_deg, distance_m):
+    """
+    Point reached by travelling distance_m meters from lat/lng along the
+    great circle with initial bearing bearing_deg, as (lat, lng) degrees.
+
+    The inverse of haversine_m and initial_bearing_deg; accepts scalars or
+    arrays like them. Longitudes are wrapped to [-180, 180).
+    """
+    phi1 = np.radians(lat)
+    theta = np.radians(bearing_deg)
+    delta = np.asarray(distance_m, dtype=np.float64) / EARTH_RADIUS_M
+
+    sin_phi2 = np.sin(phi1) * np.cos(delta) + np.cos(phi1) * np.sin(delta) * np.cos(theta)
+    phi2 = np.arcsin(np.clip(sin_phi2, -1.0, 1.0))
+    dlmb = np.arctan2(np.sin(theta) * np.sin(delta) * np.cos(phi1), np.cos(delta) - np.sin(phi1) * sin_phi2)
+    return np.degrees(phi2), (np.asarray(lng) + np.degrees(dlmb) + 180.0) % 360.0 - 180.0
+
+
+def equirectangular(lat1, lng1, lat2, lng2):
+    """
+    Fast flat-earth approximation returning (distance_m, bearing_deg).
+
+    The longitude difference is scaled by the cosine of the mean latitude and
+    the result is treated as a plane. Against haversine_m the relative
+    distance error is below 1e-6 (under 1 cm) for separations up to 10 km
+    and below 1e-4 up to 100 km, as long as |latitude| <= 70 degrees. It
+    grows with tan(latitude) squared, so keep to haversine near the poles or
+    across the antimeridian.
+    """
+    lat1 = np.asarray(lat1, dtype=np.float64)
+    lat2 = np.asarray(lat2, dtype=np.float64)
+    x = np.radians(np.asarray(lng2) - np.asarray(lng1)) * np.cos(np.radians((lat1 + lat2) / 2))
+    y = np.radians(lat2 - lat1)
+
+    distance = EARTH_RADIUS_M * np.hypot(x, y)
+    bearing = np.degrees(np.arctan2(x, y)) % 360.0
+    return distance, bearing
@@ -0,0 +1,484 @@
+# loadtest.py - Simulate many phones against server.py and the navigation API
+import argparse
+import datetime
+import http.client
+import json
+import math
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Relative weights of each request a simulated phone makes. "server" is the
+# AR hologram site (server.py), "api" the Flask navigation simulator.
+DEFAULT_MIX = {
+    'server:page': 1,
+    'server:asset': 2,
+    'server:video': 3,
+    'api:page': 1,
+    'api:asset': 2,
+    'api:nearest': 10,
+    'api:visible': 10,
+    'api:session': 10,
+}
+
+VIDEO_FILE = 'your-video-file.mp4'  # what the AR page's <video> element loads
+VIDEO_CHUNK = 256 * 1024  # bytes per ranged read, roughly what browsers ask for
+STATIC_REF_RE = re.compile(r'(?:src|href)="(/static/[^"]+)"')
+
+# Same movement model as the frontend
+MOVEMENT_SPEED = 0.00005
+ROTATION_SPEED = 15
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout:.0f}s")
+
+
+def make_site(directory, video_mb):
+    """
+    Copy the AR site into directory and add a synthetic video of video_mb
+    megabytes, so ranged reads have something to read.
+    """
+    for name in ('index.html', 'ar_marker.png'):
+        shutil.copy(os.path.join(BASE_DIR, name), directory)
+    shutil.copytree(os.path.join(BASE_DIR, 'static'), os.path.join(directory, 'static'))
+    with open(os.path.join(directory, VIDEO_FILE), 'wb') as f:
+        f.write(os.urandom(video_mb * 1024 * 1024))
+
+
+def start_server(site_dir, port, workers):
+    return subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, 'server.py'), '--port', str(port),
+         '--no-browser', '--workers', str(workers)],
+        cwd=site_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def start_api(port, points_file=None):
+    env = dict(os.environ, AR_SKIP_ASSET_BUILD='1')
+    if points_file:
+        env.update(NAV_POINTS_FILE=points_file, NAV_POINTS_POLL='0')
+    return subprocess.Popen(
+        [sys.executable, '-c',
+         f"import project; project.app.run(host='127.0.0.1', port={port}, threaded=True)"],
+        cwd=BASE_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+class Recorder:
+    """Collects (latency, ok) samples per request name from all phones"""
+
+    def __init__(self):
+        self.samples = {}
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, name, latency, ok, nbytes):
+        with self._lock:
+            self.samples.setdefault(name, []).append((latency, ok))
+            self.bytes += nbytes
+
+    def summary(self, duration):
+        requests = {}
+        for name, samples in sorted(self.samples.items()):
+            requests[name] = summarize([s[0] for s in samples], sum(not s[1] for s in samples), duration)
+        everything = [s for samples in self.samples.values() for s in samples]
+        overall = summarize([s[0] for s in everything], sum(not s[1] for s in everything), duration)
+        overall['mb_per_s'] = round(self.bytes / duration / 1e6, 2)
+        return overall, requests
+
+
+def summarize(latencies, errors, duration):
+    count = len(latencies)
+    stats = {
+        'count': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'throughput': round(count / duration, 1),
+    }
+    if count >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+        stats.update(p50_ms=round(cuts[49] * 1000, 2), p95_ms=round(cuts[94] * 1000, 2),
+                     p99_ms=round(cuts[98] * 1000, 2))
+    elif count:
+        stats.update(p50_ms=round(latencies[0] * 1000, 2), p95_ms=round(latencies[0] * 1000, 2),
+                     p99_ms=round(latencies[0] * 1000, 2))
+    return stats
+
+
+class Phone(threading.Thread):
+    """
+    One simulated phone: keep-alive connections to each target, a position
+    that moves like the frontend's, and a loop of weighted random requests.
+
+    api:session follows the frontend's live-update flow: the first one
+    creates a session and opens its event stream on a separate connection,
+    then every one POSTs the phone's position. Updates arriving on the
+    stream are recorded as api:session-push, timed from the last POST.
+    """
+
+    def __init__(self, hosts, mix, assets, video_size, recorder, stop, record, seed):
+        super().__init__(daemon=True)
+        self.hosts = hosts
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.assets = assets
+        self.video_size = video_size
+        self.recorder = recorder
+        self.stop = stop
+        self.record = record
+        self.rng = random.Random(seed)
+        self.connections = {}
+        self.lat = 37.7749 + self.rng.uniform(-0.005, 0.005)
+        self.lng = -122.4194 + self.rng.uniform(-0.005, 0.005)
+        self.heading = self.rng.randrange(0, 360, ROTATION_SPEED)
+        self.session_id = None
+        self.stream = None
+        self.position_sent = None
+
+    def run(self):
+        while not self.stop.is_set():
+            name = self.rng.choices(self.names, self.weights)[0]
+            target, kind = name.split(':')
+            start = time.perf_counter()
+            if kind == 'session':
+                ok, nbytes = self.update_session(target)
+            else:
+                path, headers = self.request_for(target, kind)
+                ok, nbytes = self.fetch(target, path, headers)
+            if self.record.is_set():
+                self.recorder.add(name, time.perf_counter() - start, ok, nbytes)
+        for connection in self.connections.values():
+            connection.close()
+        if self.stream is not None:
+            self.stream.close()
+
+    def move(self):
+        """Walk or turn, like the frontend between position updates"""
+        if self.rng.random() < 0.2:
+            self.heading = (self.heading + self.rng.choice((-ROTATION_SPEED, ROTATION_SPEED))) % 360
+        else:
+            self.lat += MOVEMENT_SPEED * math.cos(math.radians(self.heading))
+            self.lng += MOVEMENT_SPEED * math.sin(math.radians(self.heading))
+
+    def update_session(self, target):
+        """Open a session and its stream if needed, then POST the new position"""
+        if self.session_id is None:
+            ok, body = self.fetch(target, '/sessions', {}, method='POST', keep_body=True)
+            if not ok:
+                return False, 0
+            self.session_id = json.loads(body)['session_id']
+            threading.Thread(target=self.read_stream, args=(target, self.session_id), daemon=True).start()
+
+        self.move()
+        body = json.dumps({'lat': self.lat, 'lng': self.lng, 'heading': self.heading})
+        self.position_sent = time.perf_counter()
+        ok, nbytes = self.fetch(target, f'/sessions/{self.session_id}/position',
+                                {'Content-Type': 'application/json'}, method='POST', body=body)
+        if not ok:
+            self.session_id = None  # expired or server restarted: start over
+        return ok, nbytes
+
+    def read_stream(self, target, session_id):
+        """Read a session's Server-Sent Events until the phone stops or the session changes"""
+        host, port = self.hosts[target]
+        self.stream = http.client.HTTPConnection(host, port, timeout=30)
+        try:
+            self.stream.request('GET', f'/sessions/{session_id}/events')
+            response = self.stream.getresponse()
+            while not self.stop.is_set() and self.session_id == session_id:
+                line = response.readline()
+                if not line:
+                    break
+                if line.startswith(b'data:') and self.record.is_set() and self.position_sent is not None:
+                    self.recorder.add('api:session-push', time.perf_counter() - self.position_sent, True, len(line))
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            self.stream.close()
+
+    def request_for(self, target, kind):
+        headers = {'Accept-Encoding': 'gzip'}
+        if kind == 'page':
+            return '/', headers
+        if kind == 'asset':
+            return self.rng.choice(self.assets[target]), headers
+        if kind == 'video':
+            start = self.rng.randrange(0, max(self.video_size - VIDEO_CHUNK, 1))
+            headers['Range'] = f'bytes={start}-{start + VIDEO_CHUNK - 1}'
+            return f'/{VIDEO_FILE}', headers
+
+        # Navigation polling: walk or turn, then ask about the new position
+        self.move()
+        params = {'lat': f'{self.lat:.6f}', 'lng': f'{self.lng:.6f}'}
+        if kind == 'visible':
+            params['heading'] = self.heading
+        return f'/navigation-points/{kind}?{urllib.parse.urlencode(params)}', headers
+
+    def fetch(self, target, path, headers, method='GET', body=None, keep_body=False):
+        """
+        Send a request, returning (ok, body bytes), or (ok, body) with
+        keep_body. Reconnects after any error.
+        """
+        try:
+            connection = self.connections.get(target)
+            if connection is None:
+                host, port = self.hosts[target]
+                connection = self.connections[target] = http.client.HTTPConnection(host, port, timeout=30)
+            connection.request(method, path, body=body, headers=headers)
+            response = connection.getresponse()
+            data = response.read()
+            if response.will_close:
+                self.connections.pop(target).close()
+            return response.status in (200, 201, 204, 206, 304), data if keep_body else len(data)
+        except (OSError, http.client.HTTPException):
+            connection = self.connections.pop(target, None)
+            if connection is not None:
+                connection.close()
+            return False, b'' if keep_body else 0
+
+
+def discover_assets(host, port, page='/'):
+    """Static files referenced by a page, as phones would fetch them"""
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        connection.request('GET', page)
+        html = connection.getresponse().read().decode('utf-8', 'replace')
+    finally:
+        connection.close()
+    return sorted(set(STATIC_REF_RE.findall(html)))
+
+
+def run_load(hosts, mix, assets, video_size, phones, duration, warmup, seed):
+    """Run the phones for warmup + duration seconds and return the Recorder"""
+    recorder = Recorder()
+    stop, record = threading.Event(), threading.Event()
+    threads = [Phone(hosts, mix, assets, video_size, recorder, stop, record, seed + i)
+               for i in range(phones)]
+    for thread in threads:
+        thread.start()
+    time.sleep(warmup)
+    record.set()
+    time.sleep(duration)
+    record.clear()
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=30)
+    return recorder
+
+
+def combine(runs):
+    """
+    Merge the (overall, requests) summaries of repeated runs into one.
+
+    Every stat is the median across runs. p95_spread_ms (per request) and
+    throughput_spread (overall) record the max - min across runs, i.e. how
+    much the numbers move between identical runs on this machine.
+    """
+    def merge(stats):
+        merged = {key: round(statistics.median(s[key] for s in stats), 4)
+                  for key in stats[0] if all(key in s for s in stats)}
+        for key in ('count', 'errors'):
+            if key in merged:
+                merged[key] = sum(s[key] for s in stats)
+        if 'p95_ms' in merged:
+            merged['p95_spread_ms'] = round(max(s['p95_ms'] for s in stats) - min(s['p95_ms'] for s in stats), 2)
+        return merged
+
+    overall = merge([o for o, _ in runs])
+    overall['throughput_spread'] = round(max(o['throughput'] for o, _ in runs)
+                                         - min(o['throughput'] for o, _ in runs), 1)
+    names = sorted({name for _, requests in runs for name in requests})
+    requests = {name: merge([r[name] for _, r in runs if name in r]) for name in names}
+    return overall, requests
+
+
+def compare(results, baseline, tolerance, min_delta_ms=5.0, spread_factor=2.0):
+    """
+    Return a list of regressions of results against a baseline run.
+
+    A request regresses when its p95 latency grows by more than tolerance
+    and by more than the noise floor: min_delta_ms, or spread_factor times
+    the larger run-to-run p95 spread of the two results, whichever is
+    bigger. A request also regresses when its error rate grows by more than
+    a percentage point. The run regresses when overall throughput drops by
+    more than tolerance and by more than spread_factor times its spread.
+    """
+    failures = []
+    for name, before in baseline['requests'].items():
+        after = results['requests'].get(name)
+        if after is None or 'p95_ms' not in before or 'p95_ms' not in after:
+            continue
+        floor = max(min_delta_ms, spread_factor * max(before.get('p95_spread_ms', 0), after.get('p95_spread_ms', 0)))
+        if (after['p95_ms'] > before['p95_ms'] * (1 + tolerance)
+                and after['p95_ms'] - before['p95_ms'] > floor):
+            failures.append(f"{name}: p95 {before['p95_ms']} ms -> {after['p95_ms']} ms")
+        if after['error_rate'] > before['error_rate'] + 0.01:
+            failures.append(f"{name}: error rate {before['error_rate']:.2%} -> {after['error_rate']:.2%}")
+
+    before, after = baseline['overall'], results['overall']
+    spread = max(before.get('throughput_spread', 0), after.get('throughput_spread', 0))
+    if (after['throughput'] < before['throughput'] * (1 - tolerance)
+            and before['throughput'] - after['throughput'] > spread_factor * spread):
+        failures.append(f"throughput {before['throughput']} req/s -> {after['throughput']} req/s")
+    return failures
+
+
+def print_results(results):
+    print(f"{'request':<20}{'count':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'±':>7}{'p99 ms':>9}{'errors':>8}")
+    rows = list(results['requests'].items()) + [('overall', results['overall'])]
+    for name, stats in rows:
+        print(f"{name:<20}{stats['count']:>8}{stats['throughput']:>9}{stats.get('p50_ms', '-'):>9}"
+              f"{stats.get('p95_ms', '-'):>9}{stats.get('p95_spread_ms', '-'):>7}{stats.get('p99_ms', '-'):>9}"
+              f"{stats['errors']:>8}")
+    print(f"transferred {results['overall']['mb_per_s']} MB/s")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown request '{name}', choose from {', '.join(DEFAULT_MIX)}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test server.py and the navigation API with simulated phones')
+    parser.add_argument('--phones', type=int, default=50, help='Concurrent simulated phones')
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds to measure')
+    parser.add_argument('--warmup', type=float, default=2.0, help='Seconds to run before measuring')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Measure this many times and report medians, with the spread between runs')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help='Request weights, e.g. "api:nearest=5,server:video=1" (default: all)')
+    parser.add_argument('--server-url', help='Use a running server.py instead of starting one')
+    parser.add_argument('--api-url', help='Use a running navigation API instead of starting one')
+    parser.add_argument('--server-workers', type=int, default=16, help='--workers for the started server.py')
+    parser.add_argument('--video-mb', type=int, default=8, help='Size of the synthetic video file')
+    parser.add_argument('--points', type=int, default=1000,
+                        help='Navigation points the started API serves, generated from --seed')
+    parser.add_argument('--points-radius', type=float, default=2000.0,
+                        help='Radius in meters the generated points are spread over')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against this results file and fail on regression')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Allowed relative slowdown against the baseline (default 0.2 = 20%%)')
+    args = parser.parse_args()
+
+    targets = {name.split(':')[0] for name in args.mix}
+    hosts, processes = {}, []
+    site_dir = tempfile.mkdtemp(prefix='ar-loadtest-')
+    video_size = args.video_mb * 1024 * 1024
+    try:
+        if 'server' in targets:
+            if args.server_url:
+                url = urllib.parse.urlsplit(args.server_url)
+                hosts['server'] = (url.hostname, url.port or 80)
+            else:
+                make_site(site_dir, args.video_mb)
+                port = free_port()
+                processes.append(start_server(site_dir, port, args.server_workers))
+                hosts['server'] = ('127.0.0.1', port)
+        if 'api' in targets:
+            if args.api_url:
+                url = urllib.parse.urlsplit(args.api_url)
+                hosts['api'] = (url.hostname, url.port or 80)
+            else:
+                # Imported here so driving a remote --api-url needs nothing beyond the stdlib
+                from poi_generator import generate_nav_points
+                points_file = os.path.join(site_dir, 'points.pois')
+                generate_nav_points(args.points, radius=args.points_radius, seed=args.seed, output=points_file)
+                port = free_port()
+                processes.append(start_api(port, points_file))
+                hosts['api'] = ('127.0.0.1', port)
+        for host, port in hosts.values():
+            wait_for_port(port)
+
+        assets = {target: discover_assets(host, port) for target, (host, port) in hosts.items()}
+        if 'server' in assets:
+            assets['server'] += ['/ar_marker.png']
+        for target, paths in assets.items():
+            if not paths and f'{target}:asset' in args.mix:
+                parser.error(f"No static assets found on the {target} page")
+
+        print(f"{args.phones} phones for {args.repeat} x {args.duration:g}s against "
+              f"{', '.join(f'{t} on {h}:{p}' for t, (h, p) in sorted(hosts.items()))}")
+        runs = []
+        for run in range(args.repeat):
+            recorder = run_load(hosts, args.mix, assets, video_size, args.phones,
+                                args.duration, args.warmup, args.seed + run * args.phones)
+            runs.append(recorder.summary(args.duration))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait(timeout=10)
+        shutil.rmtree(site_dir, ignore_errors=True)
+
+    overall, requests = combine(runs)
+    results = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'config': {
+            'phones': args.phones,
+            'duration': args.duration,
+            'repeat': args.repeat,
+            'mix': args.mix,
+            'points': None if args.api_url else args.points,
+            'seed': args.seed,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+        },
+        'overall': overall,
+        'requests': requests,
+        'runs': [run_overall for run_overall, _ in runs],
+    }
+    print_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        failures = compare(results, baseline, args.tolerance)
+        if failures:
+            print(f"FAIL: regressed against {args.baseline}:")
+            for failure in failures:
+                print(f"- {failure}")
+            sys.exit(1)
+        print(f"OK: within {args.tolerance:.0%} of {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
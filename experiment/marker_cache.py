@@ -0,0 +1,145 @@
+# marker_cache.py - Render AR markers on demand and keep the PNG bytes around
+import functools
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+from atomic_file import atomic_write
+
+MarkerImage = namedtuple('MarkerImage', ['png', 'etag'])
+
+
+class MarkerCache:
+    """
+    Bounded LRU of rendered marker PNGs keyed by (data, size, error correction).
+
+    Markers are rendered in memory with generate_qr's layout and renderer,
+    never through a temp file. When cache_dir is given, every PNG is also
+    written there under a SHA-256 of its key, so a restarted server finds
+    earlier renders on disk instead of drawing them again. Rendering is
+    deterministic, so the key hash identifies the content as well. The
+    directory is kept under max_disk_bytes by deleting the least recently
+    used files (by mtime, which a disk hit refreshes).
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024, cache_dir=None, max_disk_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self.nbytes = 0
+        self.disk_nbytes = 0
+        self._entries = OrderedDict()
+        self._disk_files = OrderedDict()  # path -> size, least recently used first
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._scan_disk()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, data, size=400, error_correction='H'):
+        """Return the MarkerImage for a marker, rendering it if needed"""
+        key = (data, size, error_correction)
+        with self._lock:
+            marker = self._entries.get(key)
+            if marker is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return marker
+            self.misses += 1
+
+        png = self._read_disk(key)
+        if png is None:
+            png = self._render(data, size, error_correction)
+            self._write_disk(key, png)
+
+        marker = MarkerImage(png, f'"{hashlib.sha256(png).hexdigest()[:32]}"')
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = marker
+                self.nbytes += len(png)
+            while self.nbytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted.png)
+        return marker
+
+    @staticmethod
+    @functools.lru_cache(maxsize=32)
+    def _layout(size, error_correction):
+        import generate_qr
+        return generate_qr.make_layout(size, error_correction)
+
+    def _render(self, data, size, error_correction):
+        import generate_qr
+        buffer = io.BytesIO()
+        generate_qr.render_marker(data, self._layout(size, error_correction)).save(buffer, 'PNG')
+        return buffer.getvalue()
+
+    def _disk_path(self, key):
+        digest = hashlib.sha256(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], digest + '.png')
+
+    def _scan_disk(self):
+        """Index the PNGs a previous run left in cache_dir, oldest first"""
+        files = []
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith('.png'):
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, os.path.join(root, name), stat.st_size))
+        for _, path, size in sorted(files):
+            self._disk_files[path] = size
+            self.disk_nbytes += size
+        self._prune_disk()
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, 'rb') as f:
+                png = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        with self._lock:
+            if path in self._disk_files:
+                self._disk_files.move_to_end(path)
+        return png
+
+    def _prune_disk(self):
+        """Delete the least recently used files until the directory fits max_disk_bytes"""
+        with self._lock:
+            doomed = []
+            while self.disk_nbytes > self.max_disk_bytes and self._disk_files:
+                path, size = self._disk_files.popitem(last=False)
+                self.disk_nbytes -= size
+                doomed.append(path)
+        for path in doomed:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+
+    def _write_disk(self, key, png):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            with atomic_write(path) as f:
+                f.write(png)
+        except OSError:
+            return
+        with self._lock:
+            self.disk_nbytes += len(png) - self._disk_files.pop(path, 0)
+            self._disk_files[path] = len(png)
+        self._prune_disk()
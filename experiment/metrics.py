@@ -0,0 +1,278 @@
+# metrics.py - Request counters and latency histograms in Prometheus text format
+import bisect
+import threading
+import time
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds, from cached asset hits up to slow marker renders
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# The method label comes from the client's request line; anything else is
+# recorded as 'other' so made-up methods can't add series
+KNOWN_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'DELETE', 'PATCH', 'OPTIONS', 'CONNECT', 'TRACE'))
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """
+    Base for labelled metrics. Values live in a dict keyed by the tuple of
+    label values. Updates take `lock`, which several metrics may share so a
+    request can update all of them under one acquisition.
+    """
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), lock=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = lock or threading.Lock()
+        self.values = {}
+
+    def samples(self):
+        """Yield (suffix, label string, value) for rendering"""
+        with self.lock:
+            items = list(self.values.items())
+        for labels, value in items:
+            yield '', _format_labels(self.labelnames, labels), value
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, labels=(), amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+
+class Histogram(Metric):
+    """
+    Cumulative histogram. Per label set it keeps one count per bucket (not
+    cumulative, so an observation touches a single slot), the sum and the
+    count; the cumulative le= series is built at render time.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), lock=None, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames, lock)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, labels, value):
+        with self.lock:
+            self._observe(labels, value)
+
+    def _observe(self, labels, value):
+        state = self.values.get(labels)
+        if state is None:
+            state = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self):
+        with self.lock:
+            items = [(labels, (list(counts), total, count))
+                     for labels, (counts, total, count) in self.values.items()]
+        bounds = [_format_value(b) for b in self.buckets] + ['+Inf']
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(bounds, counts):
+                cumulative += n
+                yield '_bucket', _format_labels(self.labelnames, labels, f'le="{bound}"'), cumulative
+            yield '_sum', _format_labels(self.labelnames, labels), total
+            yield '_count', _format_labels(self.labelnames, labels), count
+
+
+class CallbackMetric:
+    """
+    Metric read from elsewhere at scrape time, e.g. a cache's hits counter.
+    fn returns an iterable of (labels dict, value).
+    """
+
+    def __init__(self, name, documentation, kind, fn):
+        self.name = name
+        self.documentation = documentation
+        self.kind = kind
+        self.fn = fn
+
+    def samples(self):
+        for labels, value in self.fn():
+            yield '', _format_labels(labels.keys(), labels.values()), value
+
+
+class Registry:
+    """An ordered set of metrics that renders as one Prometheus text page"""
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for suffix, labels, value in metric.samples():
+                lines.append(f'{metric.name}{suffix}{labels} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+class RequestMetrics:
+    """
+    The standard per-route request metrics, all behind one lock:
+
+        <prefix>_requests_total{route,method,status}
+        <prefix>_request_duration_seconds{route}  (histogram)
+        <prefix>_response_bytes_total{route}
+        <prefix>_requests_in_flight
+
+    Routes are templates ('/navigation-points/<int:point_id>'), never raw
+    paths, and methods outside KNOWN_METHODS count as 'other', so the
+    number of series stays bounded. Recording a request
+    costs one lock acquisition, a few dict updates and a bisect: about
+    2 us on the machine it was written on (run `python metrics.py` to
+    measure). The Flask hooks in instrument_flask bring that to about
+    8-9 us, against roughly 250 us for a cached API request, i.e. ~3%.
+    """
+
+    def __init__(self, registry, prefix):
+        lock = threading.Lock()
+        self._lock = lock
+        self.requests = registry.register(Counter(
+            f'{prefix}_requests_total', 'Requests handled.', ('route', 'method', 'status'), lock))
+        self.duration = registry.register(Histogram(
+            f'{prefix}_request_duration_seconds', 'Time spent handling a request.', ('route',), lock))
+        self.bytes = registry.register(Counter(
+            f'{prefix}_response_bytes_total', 'Response body bytes sent.', ('route',), lock))
+        self.in_flight = registry.register(Gauge(
+            f'{prefix}_requests_in_flight', 'Requests currently being handled.', (), lock))
+        self.in_flight.values[()] = 0
+
+    def started(self):
+        with self._lock:
+            self.in_flight.values[()] += 1
+
+    def finished(self, route, method, status, seconds, nbytes):
+        if method not in KNOWN_METHODS:
+            method = 'other'
+        key = (route, method, str(status))
+        route_key = (route,)
+        with self._lock:
+            values = self.requests.values
+            values[key] = values.get(key, 0) + 1
+            self.duration._observe(route_key, seconds)
+            values = self.bytes.values
+            values[route_key] = values.get(route_key, 0) + nbytes
+            self.in_flight.values[()] -= 1
+
+
+def cache_metrics(registry, prefix, caches):
+    """
+    Export hit/miss counters and size gauges for caches. caches is a
+    callable returning {name: cache} so caches swapped at runtime are
+    picked up; each cache needs hits and misses attributes and may have
+    nbytes and __len__.
+    """
+    def counts(attribute):
+        return lambda: [({'cache': name}, getattr(cache, attribute))
+                        for name, cache in caches().items() if cache is not None]
+
+    def sizes():
+        return [({'cache': name}, len(cache))
+                for name, cache in caches().items() if cache is not None and hasattr(cache, '__len__')]
+
+    def nbytes():
+        return [({'cache': name}, cache.nbytes)
+                for name, cache in caches().items() if cache is not None and hasattr(cache, 'nbytes')]
+
+    registry.register(CallbackMetric(f'{prefix}_cache_hits_total', 'Cache hits.', 'counter', counts('hits')))
+    registry.register(CallbackMetric(f'{prefix}_cache_misses_total', 'Cache misses.', 'counter', counts('misses')))
+    registry.register(CallbackMetric(f'{prefix}_cache_entries', 'Entries held in a cache.', 'gauge', sizes))
+    registry.register(CallbackMetric(f'{prefix}_cache_bytes', 'Bytes held in a cache.', 'gauge', nbytes))
+
+
+def instrument_flask(app, registry, prefix):
+    """
+    Record RequestMetrics for every request to a Flask app and serve the
+    registry at /metrics. Streaming responses (like the session event
+    stream) are timed until their headers are ready and count no bytes.
+    """
+    from flask import Response, request
+
+    metrics = RequestMetrics(registry, prefix)
+
+    # State rides in the WSGI environ: one proxy lookup per hook is much
+    # cheaper than several through flask.g
+    @app.before_request
+    def start_request_timer():
+        request.environ['metrics.state'] = [time.perf_counter(), 500, 0]
+        metrics.started()
+
+    @app.after_request
+    def record_response(response):
+        state = request.environ.get('metrics.state')
+        if state is not None:
+            state[1] = response.status_code
+            state[2] = 0 if response.is_streamed else (response.content_length or 0)
+        return response
+
+    @app.teardown_request
+    def finish_request(exc):
+        req = request._get_current_object()
+        state = req.environ.pop('metrics.state', None)
+        if state is None:
+            return
+        route = req.url_rule.rule if req.url_rule is not None else '<unmatched>'
+        metrics.finished(route, req.method, state[1], time.perf_counter() - state[0], state[2])
+
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+    return metrics
+
+
+def measure_overhead(requests=200_000):
+    """Return the seconds one started()/finished() pair costs"""
+    metrics = RequestMetrics(Registry(), 'overhead')
+    routes = [f'/route-{i}' for i in range(8)]
+    start = time.perf_counter()
+    for i in range(requests):
+        metrics.started()
+        metrics.finished(routes[i & 7], 'GET', 200, (i % 1000) / 20000, 1024)
+    return (time.perf_counter() - start) / requests
+
+
+if __name__ == "__main__":
+    per_request = min(measure_overhead() for _ in range(5))
+    print(f"Metrics overhead: {per_request * 1e6:.2f} us per request")
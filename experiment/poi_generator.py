@@ -0,0 +1,100 @@
+# poi_generator.py - Seeded, vectorized synthetic navigation points
+import argparse
+import time
+
+import numpy as np
+
+from geo import destination_point
+from poi_store import PointStore
+
+DEFAULT_CENTER = (37.7749, -122.4194)  # San Francisco, like the frontend
+_POWERS_OF_TEN = 10 ** np.arange(1, 19, dtype=np.int64)  # a number >= 10**k has more than k digits
+
+
+def generate_nav_points(n, center=DEFAULT_CENTER, radius=500.0, seed=0, min_radius=0.0,
+                        quantize=False, output=None):
+    """
+    Generate n navigation points spread uniformly over the ring between
+    min_radius and radius meters around center (lat, lng), as a PointStore.
+
+    The same seed gives the same points everywhere (NumPy's PCG64
+    generator), so benchmarks, load tests and the simulation can share a
+    dataset by passing the seed around instead of a file. Offsets are
+    great-circle ones (geo.destination_point), so the distance in each
+    description is what haversine_m measures from center. Coordinates and
+    the string table are built with array operations, about a second per
+    million points. With output the store is also saved there, ready for
+    NAV_POINTS_FILE.
+    """
+    rng = np.random.default_rng(seed)
+    # Uniform in r^2 keeps the density even instead of bunching at the centre
+    distances = np.sqrt(rng.uniform(min_radius ** 2, radius ** 2, n))
+    bearings = rng.uniform(0.0, 360.0, n)
+    lats, lngs = destination_point(center[0], center[1], bearings, distances)
+
+    # Titles take string ids 0..n-1 and descriptions n..2n-1
+    numbers = np.arange(1, n + 1)
+    title_chars, title_lengths = _format_rows(n, 'Point ', numbers)
+    description_chars, description_lengths = _format_rows(
+        n, 'Location ', numbers, ' - ', distances.astype(np.int64), 'm from center')
+    offsets = np.zeros(2 * n + 1, dtype=np.int64)
+    np.cumsum(np.concatenate((title_lengths, description_lengths)), out=offsets[1:])
+    blob = np.concatenate((title_chars, description_chars))
+
+    points = PointStore.from_arrays(lats, lngs, np.arange(n), np.arange(n, 2 * n),
+                                    quantize=quantize, string_table=(blob, offsets))
+    if output:
+        points.save(output)
+    return points
+
+
+def _format_rows(n, *pieces):
+    """
+    Write one ASCII string per row straight into bytes, concatenating str
+    constants and arrays of non-negative integers in decimal. Returns the
+    bytes of all rows back to back and each row's length.
+    """
+    widths = [np.full(n, len(piece)) if isinstance(piece, str)
+              else 1 + np.searchsorted(_POWERS_OF_TEN, piece, side='right')
+              for piece in pieces]
+    lengths = np.sum(widths, axis=0) if n else np.zeros(0, dtype=np.int64)
+    chars = np.empty(int(lengths.sum()), dtype=np.uint8)
+    cursor = np.cumsum(lengths) - lengths
+    for piece, width in zip(pieces, widths):
+        if isinstance(piece, str):
+            for offset, char in enumerate(piece.encode('ascii')):
+                chars[cursor + offset] = char
+        else:
+            # Digits from the last one backwards, while a row still has any
+            value = np.array(piece, dtype=np.int64)
+            last = cursor + width - 1
+            for place in range(int(width.max(initial=0))):
+                more = width > place
+                chars[last[more] - place] = value[more] % 10 + ord('0')
+                value //= 10
+        cursor += width
+    return chars, lengths
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic navigation point dataset')
+    parser.add_argument('count', type=int, help='Number of points')
+    parser.add_argument('output', help='Point store file to write (serve it with NAV_POINTS_FILE)')
+    parser.add_argument('--lat', type=float, default=DEFAULT_CENTER[0], help='Center latitude')
+    parser.add_argument('--lng', type=float, default=DEFAULT_CENTER[1], help='Center longitude')
+    parser.add_argument('--radius', type=float, default=500.0, help='Outer radius in meters')
+    parser.add_argument('--min-radius', type=float, default=0.0, help='Inner radius in meters')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--quantize', action='store_true', help='Store coordinates as int32 (~1 cm precision)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    points = generate_nav_points(args.count, (args.lat, args.lng), args.radius, args.seed,
+                                 args.min_radius, args.quantize, args.output)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {len(points):,} points ({points.nbytes / 1e6:.1f} MB) to {args.output} "
+          f"in {elapsed:.2f}s, version {points.content_hash()[:16]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+# poi_loader.py - Streaming GeoJSON/CSV/NDJSON point loading with hot reload
+import argparse
+import csv
+import gzip
+import json
+import logging
+import os
+import re
+import threading
+import time
+import tracemalloc
+from array import array
+from collections import namedtuple
+
+import numpy as np
+
+from poi_store import MAGIC, PointStore
+from spatial import GridIndex
+
+logger = logging.getLogger('poi_loader')
+
+CHUNK_SIZE = 1 << 16  # characters read from the file at a time
+DEFAULT_POLL_INTERVAL = 2.0  # seconds between checks for a changed file
+
+FORMATS = {
+    '.geojson': 'geojson',
+    '.json': 'geojson',
+    '.csv': 'csv',
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.geojsonl': 'ndjson',
+    '.pois': 'store',
+}
+
+# Column / property names tried in order for each field
+LAT_KEYS = ('latitude', 'lat')
+LNG_KEYS = ('longitude', 'lng', 'lon')
+TITLE_KEYS = ('title', 'name')
+DESCRIPTION_KEYS = ('description',)
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+# Everything a request needs to answer from one version of the data. Swapped
+# as a single object so a request never sees points from one file and the
+# index from another.
+Dataset = namedtuple('Dataset', ['points', 'index', 'version', 'source'])
+
+
+def build_dataset(points, source=None):
+    """Index a PointStore and compute its version, ready to be swapped in"""
+    return Dataset(points, GridIndex(points.lats, points.lngs), points.content_hash()[:16], source)
+
+
+class _JSONStream:
+    """
+    Reads JSON values one at a time from a text file, holding only the
+    unparsed tail of the input plus the value being decoded.
+
+    raw_decode() either parses a complete value or fails; a failure before
+    the end of the file means the value runs past the buffer, so more is
+    read (doubling the read each time, so a large value isn't re-parsed once
+    per chunk) and the decode retried.
+    """
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size):
+        chunk = self.f.read(size)
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        if len(chunk) < size:
+            self.eof = True
+
+    def peek(self):
+        """Skip whitespace and return the next character, '' at the end of the input"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ''
+            self._fill(self.chunk_size)
+
+    def expect(self, chars):
+        """Consume the next character, which must be one of chars"""
+        c = self.peek()
+        if not c or c not in chars:
+            raise ValueError(f"Expected one of {chars!r} in JSON input, found {c or 'end of file'!r}")
+        self.pos += 1
+        return c
+
+    def value(self):
+        """Decode and consume the next complete JSON value"""
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+                # A number that ends the buffer may continue in the next chunk
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill(size)
+            size *= 2
+
+    def array_items(self):
+        """Yield the items of an array whose '[' has been consumed"""
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(',]') == ']':
+                return
+
+
+def _first(mapping, keys, default=None):
+    for key in keys:
+        value = mapping.get(key)
+        if value is not None and value != '':
+            return value
+    return default
+
+
+def _feature_record(feature):
+    """(lng, lat, title, description, id) for a Point feature, None for other geometries"""
+    if not isinstance(feature, dict):
+        raise ValueError(f"Expected a GeoJSON feature, found {feature!r}")
+    geometry = feature.get('geometry') or {}
+    if not isinstance(geometry, dict):
+        raise ValueError(f"Expected a GeoJSON geometry, found {geometry!r}")
+    if geometry.get('type') != 'Point':
+        return None
+    properties = feature.get('properties') or {}
+    if not isinstance(properties, dict):
+        raise ValueError(f"Expected feature properties to be an object, found {properties!r}")
+    coordinates = geometry.get('coordinates') or ()
+    if len(coordinates) < 2:
+        raise ValueError("Point geometry without coordinates")
+    return (coordinates[0], coordinates[1],
+            _first(properties, TITLE_KEYS, ''), _first(properties, DESCRIPTION_KEYS, ''),
+            feature.get('id', properties.get('id')))
+
+
+def _flat_record(row):
+    """(lng, lat, title, description, id) for a CSV row or flat JSON object"""
+    lng, lat = _first(row, LNG_KEYS), _first(row, LAT_KEYS)
+    if lng is None or lat is None:
+        raise ValueError(f"Record needs one of {LAT_KEYS} and one of {LNG_KEYS}")
+    return (lng, lat, _first(row, TITLE_KEYS, ''), _first(row, DESCRIPTION_KEYS, ''),
+            _first(row, ('id',)))
+
+
+def iter_geojson(f, chunk_size=CHUNK_SIZE):
+    """
+    Yield a record per Point feature of a FeatureCollection (or a bare array
+    of features), decoding one feature at a time. Other top-level members
+    ('type', 'crs', 'bbox', ...) are read and discarded wherever they appear.
+    """
+    stream = _JSONStream(f, chunk_size)
+    features = stream.array_items() if stream.expect('{[') == '[' else _collection_features(stream)
+    for feature in features:
+        record = _feature_record(feature)
+        if record is not None:
+            yield record
+
+
+def _collection_features(stream):
+    if stream.peek() == '}':
+        return
+    while True:
+        key = stream.value()
+        stream.expect(':')
+        if key == 'features':
+            stream.expect('[')
+            yield from stream.array_items()
+        else:
+            stream.value()
+        if stream.expect(',}') == '}':
+            return
+
+
+def iter_ndjson(f):
+    """Yield a record per line: a GeoJSON Feature or a flat object with lat/lng keys"""
+    for line in f:
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        if not isinstance(item, dict):
+            raise ValueError(f"Expected a JSON object per line, found {item!r}")
+        record = _feature_record(item) if item.get('type') == 'Feature' else _flat_record(item)
+        if record is not None:
+            yield record
+
+
+def iter_csv(f):
+    """Yield a record per CSV row; the header names the columns (see LAT_KEYS etc.)"""
+    for row in csv.DictReader(f):
+        yield _flat_record({key.strip().lower(): value for key, value in row.items() if key})
+
+
+def build_store(records, quantize=False):
+    """
+    Build a PointStore from (lng, lat, title, description, id) records.
+
+    Coordinates and string ids go straight into typed arrays as they
+    stream past, so memory grows by a few dozen bytes per point plus the
+    distinct strings, never by a Python object per value. Ids are taken
+    from the records if every one is an integer (or an integer string), and
+    then they must be unique. If any is missing or isn't, e.g. GeoJSON
+    string ids like "node/123", the points are numbered from 1 instead.
+    """
+    lats, lngs = array('d'), array('d')
+    title_ids, description_ids = array('i'), array('i')
+    ids = array('q')
+    interned = {}
+    has_ids = True
+    for n, (lng, lat, title, description, point_id) in enumerate(records, 1):
+        try:
+            lng, lat = float(lng), float(lat)
+        except (TypeError, ValueError):
+            raise ValueError(f"Point {n}: bad coordinates {(lng, lat)!r}")
+        if has_ids:
+            point_id = _integer_id(point_id)
+            if point_id is None:
+                has_ids = False
+                ids = None
+                if n > 1:
+                    logger.warning("Point %d has no integer id, numbering all points from 1 instead", n)
+            else:
+                ids.append(point_id)
+        if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+            raise ValueError(f"Point {n}: coordinates out of range (lng={lng}, lat={lat})")
+        lats.append(lat)
+        lngs.append(lng)
+        title_ids.append(interned.setdefault(str(title), len(interned)))
+        description_ids.append(interned.setdefault(str(description), len(interned)))
+
+    if has_ids and len(np.unique(ids)) != len(ids):
+        raise ValueError("Point ids are not unique")
+
+    return PointStore.from_arrays(
+        np.frombuffer(lats, dtype=np.float64), np.frombuffer(lngs, dtype=np.float64),
+        np.frombuffer(title_ids, dtype=np.int32), np.frombuffer(description_ids, dtype=np.int32),
+        list(interned), ids=np.frombuffer(ids, dtype=np.int64) if has_ids else None,
+        quantize=quantize)
+
+
+def _integer_id(value):
+    """value as an int64 id if it is an integer or an integer string, else None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value if -2 ** 63 <= value < 2 ** 63 else None
+    if isinstance(value, float):
+        return int(value) if value.is_integer() and abs(value) < 2 ** 63 else None
+    if isinstance(value, str):
+        try:
+            return _integer_id(int(value.strip()))
+        except ValueError:
+            return None
+    return None
+
+
+def detect_format(path):
+    """Guess the format from the file name, looking past a .gz suffix"""
+    name = path[:-3] if path.endswith('.gz') else path
+    fmt = FORMATS.get(os.path.splitext(name)[1].lower())
+    if fmt is None:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) == MAGIC:
+                return 'store'
+        raise ValueError(f"Can't tell the format of {path}; use one of {sorted(FORMATS)}")
+    return fmt
+
+
+def load_points(path, fmt=None, quantize=False, chunk_size=CHUNK_SIZE):
+    """
+    Load a PointStore from a GeoJSON, CSV or NDJSON file (optionally
+    gzipped) in a single streaming pass, or map a file written by
+    PointStore.save().
+    """
+    fmt = fmt or detect_format(path)
+    if fmt == 'store':
+        return PointStore.load(path)
+
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8-sig', newline='') as f:
+        if fmt == 'geojson':
+            records = iter_geojson(f, chunk_size)
+        elif fmt == 'ndjson':
+            records = iter_ndjson(f)
+        elif fmt == 'csv':
+            records = iter_csv(f)
+        else:
+            raise ValueError(f"Unknown point file format '{fmt}'")
+        try:
+            return build_store(records, quantize=quantize)
+        except (csv.Error, TypeError, EOFError) as e:  # EOFError: truncated .gz
+            raise ValueError(f"{path}: {e}")
+
+
+def _file_state(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class DatasetWatcher:
+    """
+    Keeps a dataset in sync with a point file.
+
+    A daemon thread stats the file every `interval` seconds. Once a change
+    has held still for one interval (so a file being written in place isn't
+    read half-way) the file is loaded and indexed on that thread and the
+    new Dataset is passed to on_load, which swaps it in. Requests keep being
+    served from the old dataset until then, and one that fails to load is
+    logged and skipped, leaving the old one in place.
+    """
+
+    def __init__(self, path, on_load, interval=DEFAULT_POLL_INTERVAL, fmt=None, quantize=False):
+        self.path = path
+        self.on_load = on_load
+        self.interval = interval
+        self.fmt = fmt
+        self.quantize = quantize
+        self.reloads = 0
+        self.failures = 0
+        self._state = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def load(self):
+        """Load the file now; only changes made after this trigger a reload"""
+        self._state = _file_state(self.path)
+        return build_dataset(load_points(self.path, self.fmt, self.quantize), self.path)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='poi-watcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def _run(self):
+        pending = None
+        while not self._stopped.wait(self.interval):
+            state = _file_state(self.path)
+            if state is None or state == self._state:
+                pending = None
+            elif state != pending:
+                pending = state
+            else:
+                pending = None
+                self.reload()
+
+    def reload(self):
+        """Load and swap in the file's current contents, returning the Dataset (None on failure)"""
+        start = time.perf_counter()
+        try:
+            dataset = self.load()
+            self.on_load(dataset)
+        except (OSError, ValueError) as e:
+            self.failures += 1
+            logger.warning("Keeping the current points, reloading %s failed: %s", self.path, e)
+            return None
+        except Exception:
+            # A bug or a bad file we didn't anticipate; either way the
+            # watcher lives on
+            self.failures += 1
+            logger.exception("Keeping the current points, reloading %s failed", self.path)
+            return None
+        self.reloads += 1
+        logger.info("Reloaded %d points from %s in %.2fs (version %s)",
+                    len(dataset.points), self.path, time.perf_counter() - start, dataset.version)
+        return dataset
+
+
+def traced_peak(fn, *args):
+    """Run fn under tracemalloc and return (result, peak bytes allocated)"""
+    tracemalloc.start()
+    try:
+        result = fn(*args)
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load a point file and report throughput and peak memory')
+    parser.add_argument('path', help='GeoJSON, CSV or NDJSON file (optionally .gz), or a saved point store')
+    parser.add_argument('--format', choices=sorted(set(FORMATS.values())), help='Override format detection')
+    parser.add_argument('--quantize', action='store_true', help='Store coordinates as int32 (~1 cm precision)')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the second, traced pass')
+    parser.add_argument('--save', help='Write the loaded points with PointStore.save() to this path')
+    args = parser.parse_args()
+
+    # Timed without tracing, which slows allocation-heavy parsing several fold
+    start = time.perf_counter()
+    points = load_points(args.path, args.format, args.quantize)
+    loaded = time.perf_counter()
+    dataset = build_dataset(points, args.path)
+    indexed = time.perf_counter()
+
+    load_s, index_s = loaded - start, indexed - loaded
+    print(f"Points:       {len(points):,}")
+    print(f"Load:         {load_s:.3f}s ({len(points) / max(load_s, 1e-9):,.0f} points/s)")
+    print(f"Index:        {index_s:.3f}s")
+    print(f"Store size:   {points.nbytes / 1e6:.1f} MB")
+    print(f"Version:      {dataset.version}")
+
+    if not args.no_memory:
+        del dataset, points
+        points, load_peak = traced_peak(load_points, args.path, args.format, args.quantize)
+        _, index_peak = traced_peak(build_dataset, points, args.path)
+        print(f"Peak memory:  {load_peak / 1e6:.1f} MB loading, {index_peak / 1e6:.1f} MB indexing"
+              " (traced Python and NumPy allocations)")
+
+    if args.save:
+        points.save(args.save)
+        print(f"Saved to {args.save}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# poi_store.py - Columnar, memory-mappable store for navigation points
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+from atomic_file import atomic_write
+
+MAGIC = b'POIS'
+FORMAT_VERSION = 1
+QUANTA_PER_DEG = 10_000_000  # int32 quantization, one step is ~1.1 cm
+_ALIGN = 8
+
+
+class PointStore:
+    """
+    Navigation points kept as parallel NumPy arrays instead of Python objects.
+
+    Coordinates are float64, or int32 counts of 1/QUANTA_PER_DEG degrees when
+    the store is quantized (half the memory, ~1 cm precision). Titles and descriptions
+    are ids into one interned string table held as a UTF-8 blob plus
+    offsets, so repeated strings are stored once and nothing is decoded until
+    a point is actually serialized.
+
+    save() writes everything into a single file of aligned sections and
+    load() maps it back with np.memmap, so opening a multi-million-point
+    dataset costs a header parse rather than a full read.
+    """
+
+    def __init__(self, lats, lngs, title_ids, description_ids, string_blob,
+                 string_offsets, ids=None, quantized=False):
+        self._lat_raw = lats
+        self._lng_raw = lngs
+        self.quantized = quantized
+        self.title_ids = title_ids
+        self.description_ids = description_ids
+        self.string_blob = string_blob
+        self.string_offsets = string_offsets
+        if ids is None:
+            ids = np.arange(1, len(lats) + 1, dtype=np.int64)
+        self.ids = ids
+        self._dense_ids = None
+        self._id_order = None
+
+    @classmethod
+    def from_rows(cls, rows, ids=None, quantize=False):
+        """Build a store from (longitude, latitude, title, description) rows"""
+        interned = {}
+        lngs, lats, title_ids, description_ids = [], [], [], []
+        for lng, lat, title, description in rows:
+            lngs.append(lng)
+            lats.append(lat)
+            title_ids.append(interned.setdefault(title, len(interned)))
+            description_ids.append(interned.setdefault(description, len(interned)))
+
+        return cls.from_arrays(
+            np.array(lats, dtype=np.float64),
+            np.array(lngs, dtype=np.float64),
+            np.array(title_ids, dtype=np.int32),
+            np.array(description_ids, dtype=np.int32),
+            list(interned),
+            ids=ids,
+            quantize=quantize,
+        )
+
+    @classmethod
+    def from_arrays(cls, lats, lngs, title_ids, description_ids, strings=(), ids=None, quantize=False,
+                    string_table=None):
+        """
+        Build a store from coordinate arrays, string ids and the string
+        table, given as a list of strings or already encoded as a
+        string_table=(blob, offsets) pair.
+        """
+        if string_table is not None:
+            blob, offsets = string_table
+        else:
+            encoded = [s.encode('utf-8') for s in strings]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+            np.cumsum([len(b) for b in encoded], out=offsets[1:])
+            blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+
+        lats = np.asarray(lats, dtype=np.float64)
+        lngs = np.asarray(lngs, dtype=np.float64)
+        if quantize:
+            lats = np.round(lats * QUANTA_PER_DEG).astype(np.int32)
+            lngs = np.round(lngs * QUANTA_PER_DEG).astype(np.int32)
+        if ids is not None:
+            ids = np.asarray(ids, dtype=np.int64)
+
+        return cls(lats, lngs, np.asarray(title_ids, dtype=np.int32),
+                   np.asarray(description_ids, dtype=np.int32), np.asarray(blob, dtype=np.uint8),
+                   np.asarray(offsets, dtype=np.int64),
+                   ids=ids, quantized=quantize)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def lats(self):
+        """
+        Latitudes as float64. A quantized store dequantizes into a new array
+        on every access rather than keeping a float64 copy around, which
+        would undo the memory saving; callers that need them repeatedly
+        (like GridIndex) hold on to the result.
+        """
+        return self._lat_raw / QUANTA_PER_DEG if self.quantized else self._lat_raw
+
+    @property
+    def lngs(self):
+        """Longitudes as float64, see lats"""
+        return self._lng_raw / QUANTA_PER_DEG if self.quantized else self._lng_raw
+
+    def _coordinate(self, raw, index):
+        value = float(raw[index])
+        return value / QUANTA_PER_DEG if self.quantized else value
+
+    @property
+    def nbytes(self):
+        """Memory taken by the arrays (or mapped from disk)"""
+        return sum(a.nbytes for a in self._sections().values())
+
+    def string(self, string_id):
+        start, end = self.string_offsets[string_id], self.string_offsets[string_id + 1]
+        return self.string_blob[start:end].tobytes().decode('utf-8')
+
+    def title(self, index):
+        return self.string(self.title_ids[index])
+
+    def description(self, index):
+        return self.string(self.description_ids[index])
+
+    def index_of(self, point_id):
+        """Return the row index of a point id, or None if there's no such point"""
+        n = len(self.ids)
+        if self._dense_ids is None:
+            # Ids are almost always 1..n, which makes lookup plain arithmetic
+            ids = self.ids
+            self._dense_ids = n == 0 or (int(ids[0]) == 1 and int(ids[-1]) == n
+                                         and bool(np.all(np.diff(ids) == 1)))
+        if self._dense_ids:
+            return point_id - 1 if 1 <= point_id <= n else None
+
+        if self._id_order is None:
+            self._id_order = np.argsort(self.ids, kind='stable')
+        pos = int(np.searchsorted(self.ids, point_id, sorter=self._id_order))
+        if pos < n and self.ids[self._id_order[pos]] == point_id:
+            return int(self._id_order[pos])
+        return None
+
+    def point(self, index):
+        """Serialize the point at a row index the way the API returns it"""
+        return {
+            "id": int(self.ids[index]),
+            "latitude": self._coordinate(self._lat_raw, index),
+            "longitude": self._coordinate(self._lng_raw, index),
+            "title": self.title(index),
+            "description": self.description(index)
+        }
+
+    def content_hash(self):
+        """Hex digest over every section, usable as a dataset version"""
+        digest = hashlib.sha1()
+        for name, array in self._sections().items():
+            digest.update(name.encode('ascii'))
+            digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def _sections(self):
+        return {
+            'lat': self._lat_raw,
+            'lng': self._lng_raw,
+            'title_ids': self.title_ids,
+            'description_ids': self.description_ids,
+            'string_offsets': self.string_offsets,
+            'string_blob': self.string_blob,
+            'ids': self.ids,
+        }
+
+    def save(self, path):
+        """
+        Write the store to a single binary file.
+
+        Layout: MAGIC, format version and header length (little-endian
+        uint32s), a JSON header describing each section, then the raw
+        sections, each starting on an 8-byte boundary.
+        """
+        sections = self._sections()
+        layout = {}
+        offset = 0
+        for name, array in sections.items():
+            array = np.ascontiguousarray(array)
+            sections[name] = array
+            layout[name] = {'offset': offset, 'dtype': array.dtype.str, 'count': int(array.size)}
+            offset += -(-array.nbytes // _ALIGN) * _ALIGN
+
+        header = json.dumps({
+            'count': len(self),
+            'quantized': self.quantized,
+            'sections': layout,
+        }).encode('utf-8')
+        prefix_len = 12 + len(header)
+        data_start = -(-prefix_len // _ALIGN) * _ALIGN
+
+        with atomic_write(path) as f:
+            f.write(MAGIC + struct.pack('<II', FORMAT_VERSION, len(header)) + header)
+            f.write(b'\0' * (data_start - prefix_len))
+            for name, array in sections.items():
+                f.write(array.tobytes())
+                f.write(b'\0' * (-array.nbytes % _ALIGN))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Open a file written by save().
+
+        With mmap=True (the default) the arrays are read-only views over a
+        memory map, so pages are only read from disk as they are touched.
+        Raises ValueError for a file that is empty, truncated or not a point
+        store (e.g. one still being written).
+        """
+        with open(path, 'rb') as f:
+            prefix = f.read(12)
+            if len(prefix) < 12 or prefix[:4] != MAGIC:
+                raise ValueError(f"{path} is not a point store file")
+            version, header_len = struct.unpack('<II', prefix[4:])
+            if version != FORMAT_VERSION:
+                raise ValueError(f"Unsupported point store format version {version}")
+            header_bytes = f.read(header_len)
+            if len(header_bytes) < header_len:
+                raise ValueError(f"{path} is truncated")
+            try:
+                header = json.loads(header_bytes.decode('utf-8'))
+                sections = {name: (np.dtype(info['dtype']), info['offset'], info['count'])
+                            for name, info in header['sections'].items()}
+                quantized = header['quantized']
+            except (KeyError, TypeError) as e:
+                raise ValueError(f"{path} has a malformed header: {e!r}")
+
+        data_start = -(-(12 + header_len) // _ALIGN) * _ALIGN
+        file_size = os.path.getsize(path)
+        for name, (dtype, offset, count) in sections.items():
+            if data_start + offset + count * dtype.itemsize > file_size:
+                raise ValueError(f"{path} is truncated (section {name})")
+        if mmap:
+            raw = np.memmap(path, dtype=np.uint8, mode='r')
+        else:
+            with open(path, 'rb') as f:
+                raw = np.frombuffer(f.read(), dtype=np.uint8)
+
+        arrays = {}
+        for name, (dtype, offset, count) in sections.items():
+            start = data_start + offset
+            arrays[name] = raw[start:start + count * dtype.itemsize].view(dtype)
+
+        try:
+            return cls(arrays['lat'], arrays['lng'], arrays['title_ids'],
+                       arrays['description_ids'], arrays['string_blob'],
+                       arrays['string_offsets'], ids=arrays['ids'],
+                       quantized=quantized)
+        except KeyError as e:
+            raise ValueError(f"{path} is missing section {e}")
@@ -0,0 +1,172 @@
+# profiling.py - Sampled per-request stack profiling with flamegraph output
+import atexit
+import os
+import random
+import re
+import sys
+import threading
+import time
+import warnings
+from collections import Counter
+
+from atomic_file import atomic_write
+
+PROFILE_HEADER = 'X-Profile'  # "1" profiles this request regardless of the sample rate
+UNSAFE_NAME_RE = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+class RequestProfiler:
+    """
+    Statistical profiler for a sampled fraction of requests.
+
+    A request picked for profiling registers its thread; while any are
+    registered a background thread wakes every `interval` seconds, reads
+    their current stacks via sys._current_frames() and counts each stack
+    under the request's route. Requests that aren't picked pay for one
+    random() call, and nothing samples when no profiled request is in
+    flight, so it can stay on in staging at a low sample rate. The sampler
+    only gets the GIL when the request thread yields it (at I/O, or every
+    sys.getswitchinterval(), 5 ms by default), so fast CPU-bound routes
+    show up across many requests rather than within one.
+
+    Stacks are written as collapsed-stack files (one
+    "frame;frame;frame count" line per stack), one per route plus
+    all.folded with the route as the root frame, ready for flamegraph.pl
+    or speedscope. Files are rewritten every flush_interval seconds while
+    new samples come in, and at exit.
+
+    Requests are told apart by OS thread ident, so this only works with
+    real threads. Under gevent monkey patching the ident is a greenlet's,
+    which sys._current_frames() never reports, so the profiler warns and
+    stays disabled there.
+    """
+
+    def __init__(self, sample_rate=0.01, interval=0.001, output_dir='profiles', flush_interval=10.0):
+        self.sample_rate = sample_rate
+        self.interval = interval
+        self.output_dir = output_dir
+        self.flush_interval = flush_interval
+        self.stacks = {}  # route -> Counter of collapsed stacks
+        self.requests = Counter()  # route -> profiled requests
+        self._active = {}  # thread ident -> route
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._dirty = False
+        self._stopped = False
+        self.enabled = not _green_threads()
+        if not self.enabled:
+            warnings.warn("RequestProfiler samples OS threads and can't see gevent greenlets; profiling is off")
+            return
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def should_profile(self, header_value=None):
+        """Whether to profile a request, given its X-Profile header"""
+        if not self.enabled:
+            return False
+        if header_value is not None and header_value.strip().lower() in ('1', 'true', 'yes'):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def begin(self, route):
+        """Start sampling the calling thread under route; returns a token for end()"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._active[ident] = route
+            self.requests[route] += 1
+        self._wake.set()
+        return ident
+
+    def end(self, token):
+        with self._lock:
+            self._active.pop(token, None)
+            if not self._active:
+                self._wake.clear()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while not self._stopped:
+            # Wake up at least every flush_interval so samples taken just
+            # before things went quiet still reach disk
+            if not self._wake.wait(timeout=self.flush_interval):
+                self.flush()
+                last_flush = time.monotonic()
+                continue
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for ident, route in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        self.stacks.setdefault(route, Counter())[collapse(frame)] += 1
+                        self._dirty = True
+            del frames
+            if self.output_dir and time.monotonic() - last_flush >= self.flush_interval:
+                self.flush()
+                last_flush = time.monotonic()
+
+    def flush(self):
+        """Write the collapsed-stack files if anything changed since the last write"""
+        with self._lock:
+            if not self._dirty or not self.output_dir:
+                return
+            snapshot = {route: Counter(stacks) for route, stacks in self.stacks.items()}
+            self._dirty = False
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        combined = Counter()
+        for route, stacks in snapshot.items():
+            root = route.replace(';', ':')
+            combined.update({f'{root};{stack}': count for stack, count in stacks.items()})
+            name = UNSAFE_NAME_RE.sub('_', route).strip('_') or 'root'
+            _write_folded(os.path.join(self.output_dir, f'{name}.folded'), stacks)
+        _write_folded(os.path.join(self.output_dir, 'all.folded'), combined)
+
+    def close(self):
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+
+
+def _green_threads():
+    """Whether gevent has monkey patched threading, making idents greenlet ids"""
+    monkey = sys.modules.get('gevent.monkey')
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def collapse(frame):
+    """Collapsed-stack string for a frame, outermost call first"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+                     .replace(';', ':'))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def _write_folded(path, stacks):
+    with atomic_write(path, 'w') as f:
+        for stack, count in stacks.most_common():
+            f.write(f'{stack} {count}\n')
+
+
+def profile_flask(app, profiler):
+    """Profile a sampled fraction of a Flask app's requests, labelled by URL rule"""
+    from flask import request
+
+    @app.before_request
+    def start_profiling():
+        req = request._get_current_object()
+        if profiler.should_profile(req.headers.get(PROFILE_HEADER)):
+            route = req.url_rule.rule if req.url_rule is not None else '<unmatched>'
+            req.environ['profile.token'] = profiler.begin(route)
+
+    @app.teardown_request
+    def stop_profiling(exc):
+        token = request.environ.pop('profile.token', None)
+        if token is not None:
+            profiler.end(token)
+
+    return profiler
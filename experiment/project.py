@@ -1,69 +1,445 @@
 # app.py - Fully simulated AR navigation app
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, Response, render_template, jsonify, request
+import hashlib
 import json
-import os
 import math
-import random
+import os
+import threading
+
+import numpy as np
+
+from asset_pipeline import build_pipeline
+from atomic_file import atomic_write
+from metrics import CallbackMetric, Registry, cache_metrics, instrument_flask
+from profiling import RequestProfiler, profile_flask
+from geo import initial_bearing_deg
+from poi_generator import generate_nav_points
+from poi_loader import DEFAULT_POLL_INTERVAL, DatasetWatcher, build_dataset
+from response_cache import ResponseCache, cached_response
+from routing import DEFAULT_LANDMARKS, RouteGraph
+from sessions import SessionRegistry, diff_ids
 
 app = Flask(__name__)
 
-# Sample navigation points near a simulated user position
-# Format: [longitude, latitude, title, description]
+# Sample navigation points near a simulated user position: SAMPLE_COUNT
+# points 50-500 meters from the base location, the same ones on every start
 BASE_LAT = 37.7749  # San Francisco latitude
 BASE_LNG = -122.4194  # San Francisco longitude
+SAMPLE_COUNT = 10
+SAMPLE_SEED = 0
 
-# Generate points in a circle around the base location
-SAMPLE_NAV_POINTS = []
-for i in range(10):
-    # Random distance between 50-500 meters
-    distance = random.uniform(50, 500)
-    # Random bearing in degrees
-    bearing = random.uniform(0, 360)
-    
-    # Convert distance and bearing to lat/lng offset
-    # Rough approximation (not accounting for Earth's curvature for short distances)
-    lat_offset = distance * math.cos(math.radians(bearing)) / 111000  # 1 degree ~ 111km
-    lng_offset = distance * math.sin(math.radians(bearing)) / (111000 * math.cos(math.radians(BASE_LAT)))
-    
-    point_lat = BASE_LAT + lat_offset
-    point_lng = BASE_LNG + lng_offset
-    
-    SAMPLE_NAV_POINTS.append([
-        point_lng, 
-        point_lat, 
-        f"Point {chr(65+i)}", 
-        f"Location {i+1} - {int(distance)}m from center"
-    ])
+def swap_dataset(dataset):
+    """
+    Serve a new Dataset from the next request on. Requests already running
+    finish on the one they started with, and sessions are resynced on
+    their next update since their point indices refer to the old one.
+    Its route graph starts building in the background.
+    """
+    global DATASET
+    DATASET = dataset
+    build_route_graph(dataset)
+
+# The points behind the API (a columnar PointStore), their spatial index and
+# version, as one Dataset. Set NAV_POINTS_FILE to a GeoJSON, CSV or NDJSON
+# file, or one written by PointStore.save(), to serve a real dataset instead
+# of the sample points. The first load (parsing, content hash and GridIndex)
+# runs here at import, so a big file delays startup rather than the first
+# request. After that the file is watched every NAV_POINTS_POLL seconds (0
+# turns that off) and reloaded on the watcher thread, off the request path,
+# when it changes.
+DATASET_WATCHER = None
+if os.environ.get('NAV_POINTS_FILE'):
+    DATASET_WATCHER = DatasetWatcher(os.environ['NAV_POINTS_FILE'], swap_dataset,
+                                     float(os.environ.get('NAV_POINTS_POLL', DEFAULT_POLL_INTERVAL)))
+    DATASET = DATASET_WATCHER.load()
+    if DATASET_WATCHER.interval > 0:
+        DATASET_WATCHER.start()
+else:
+    DATASET = build_dataset(generate_nav_points(SAMPLE_COUNT, (BASE_LAT, BASE_LNG), radius=500.0,
+                                                seed=SAMPLE_SEED, min_radius=50.0))
+
+def _dataset():
+    """The Dataset for the current request, fixed at first use so a swap can't split a request"""
+    environ = request.environ
+    dataset = environ.get('nav.dataset')
+    if dataset is None:
+        dataset = environ['nav.dataset'] = DATASET
+    return dataset
 
 @app.route('/')
 def index():
     """Serve the main AR application page"""
     return render_template('index.html')
 
+# Serialized responses keyed by query and dataset version. The version is a
+# hash of the points, so it only changes when the data does. Only responses
+# that repeat across clients are cached: the full point list, single points
+# and routes between point ids. Queries at a user's coordinates practically
+# never repeat, so they skip the cache.
+RESPONSE_CACHE = ResponseCache(max_entries=1024, max_bytes=64 * 1024 * 1024)
+cached = cached_response(RESPONSE_CACHE, lambda: _dataset().version)
+cached_without_args = cached_response(RESPONSE_CACHE, lambda: _dataset().version,
+                                      when=lambda: not request.args)
+
+MAX_NEAREST = 100  # most points /navigation-points/nearest returns
+
+def _float_arg(name, default=None):
+    """
+    Read a float query parameter, raising ValueError if it's invalid, not
+    finite (nan and inf would end up as bare NaN in the JSON) or missing
+    with no default.
+    """
+    value = request.args.get(name)
+    if value is None:
+        if default is None:
+            raise ValueError(f"Missing query parameter '{name}'")
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        number = math.nan
+    if not math.isfinite(number):
+        raise ValueError(f"Query parameter '{name}' must be a finite number")
+    return number
+
+def _int_arg(name, default=None, low=-2 ** 63, high=2 ** 63 - 1):
+    """Read an integer query parameter in [low, high], raising ValueError like _float_arg"""
+    value = request.args.get(name)
+    if value is None:
+        if default is None:
+            raise ValueError(f"Missing query parameter '{name}'")
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"Query parameter '{name}' must be an integer")
+    if not low <= number <= high:
+        raise ValueError(f"Query parameter '{name}' must be between {low} and {high}")
+    return number
+
 @app.route('/navigation-points')
+@cached_without_args
 def get_navigation_points():
-    """Return all navigation points"""
+    """
+    Return navigation points.
+
+    With no parameters every point is returned. Pass lat, lng and radius_m to
+    get the points within radius_m meters (nearest first, with distance_m), or
+    bbox=min_lng,min_lat,max_lng,max_lat to get the points inside a box.
+    """
+    dataset = _dataset()
+    try:
+        if 'bbox' in request.args:
+            try:
+                min_lng, min_lat, max_lng, max_lat = (float(v) for v in request.args['bbox'].split(','))
+                if not all(map(math.isfinite, (min_lng, min_lat, max_lng, max_lat))):
+                    raise ValueError
+            except ValueError:
+                raise ValueError("bbox must be 'min_lng,min_lat,max_lng,max_lat' (finite numbers)")
+            indices = dataset.index.query_bbox(min_lng, min_lat, max_lng, max_lat)
+            points = [dataset.points.point(i) for i in indices]
+        elif 'radius_m' in request.args:
+            lat, lng, radius_m = _float_arg('lat'), _float_arg('lng'), _float_arg('radius_m')
+            indices, distances = dataset.index.query_radius(lat, lng, radius_m)
+            points = []
+            for i, distance in zip(indices, distances):
+                point = dataset.points.point(i)
+                point["distance_m"] = round(float(distance), 1)
+                points.append(point)
+        else:
+            points = [dataset.points.point(i) for i in range(len(dataset.points))]
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(points)
+
+@app.route('/navigation-points/<int:point_id>')
+@cached
+def get_navigation_point(point_id):
+    """Return a single navigation point by id"""
+    points = _dataset().points
+    index = points.index_of(point_id)
+    if index is None:
+        return jsonify({"error": f"No navigation point with id {point_id}"}), 404
+    return jsonify(points.point(index))
+
+@app.route('/navigation-points/nearest')
+def get_nearest_navigation_points():
+    """
+    Return the k points nearest to lat/lng, nearest first. k defaults to 5
+    and must be between 1 and MAX_NEAREST.
+
+    Each point carries distance_m and bearing_deg so clients don't have to
+    compute them. Pass fast=1 to use the equirectangular approximation, which
+    is accurate to well under a meter for points within a few kilometers.
+    """
+    try:
+        lat, lng = _float_arg('lat'), _float_arg('lng')
+        k = _int_arg('k', 5, low=1, high=MAX_NEAREST)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    fast = request.args.get('fast', '0').lower() in ('1', 'true', 'yes')
+
+    dataset = _dataset()
+    indices, distances, bearings = dataset.index.nearest(lat, lng, k, fast=fast)
     points = []
-    for lng, lat, title, description in SAMPLE_NAV_POINTS:
-        points.append({
-            "id": len(points) + 1,
-            "latitude": lat,
-            "longitude": lng,
-            "title": title,
-            "description": description
-        })
-    
+    for i, distance, bearing in zip(indices, distances, bearings):
+        point = dataset.points.point(i)
+        point["distance_m"] = round(float(distance), 1)
+        point["bearing_deg"] = round(float(bearing), 1)
+        points.append(point)
+
     return jsonify(points)
 
-# Create required directories if they don't exist
-if not os.path.exists('templates'):
-    os.makedirs('templates')
-if not os.path.exists('static'):
-    os.makedirs('static')
+def _view_cone(index, lat, lng, heading, fov=120.0, max_distance=1000.0):
+    """
+    Find the points within max_distance meters and fov/2 degrees of heading.
+
+    Returns (indices, distances, bearings, relative_bearings, half_fov) as
+    arrays ordered nearest first.
+    """
+    half_fov = max(0.0, min(float(fov), 360.0)) / 2
+    indices, distances = index.query_radius(lat, lng, max_distance)
+
+    bearings = initial_bearing_deg(lat, lng, index.lats[indices], index.lngs[indices])
+    relative = (bearings - heading + 180.0) % 360.0 - 180.0  # -180..180, 0 = straight ahead
+    in_view = np.abs(relative) <= half_fov
+    return indices[in_view], distances[in_view], bearings[in_view], relative[in_view], half_fov
+
+def visible(lat, lng, heading, fov=120.0, max_distance=1000.0, dataset=None):
+    """
+    Return the points inside the view cone of a user at lat/lng facing heading.
+
+    Only points within max_distance meters are considered (via the dataset's
+    spatial index, DATASET's by default),
+    and of those only the ones within fov/2 degrees of the heading are kept.
+    Each point gets its signed relative_bearing, screen_x (-1 at the left
+    edge of the view, 1 at the right) and the marker scale factor, ordered
+    nearest first.
+    """
+    dataset = dataset or DATASET
+    indices, distances, bearings, relative, half_fov = _view_cone(
+        dataset.index, lat, lng, heading, fov, max_distance)
+    screen_x = relative / half_fov if half_fov else np.zeros_like(relative)
+    # Closer = bigger, same curve the AR overlay has always used
+    scales = np.clip(1 - distances / 500, 0.5, 1.5)
+
+    points = []
+    for i, distance, bearing, rel, x, scale in zip(
+            indices, distances, bearings, relative, screen_x, scales):
+        point = dataset.points.point(i)
+        point["distance_m"] = round(float(distance), 1)
+        point["bearing_deg"] = round(float(bearing), 1)
+        point["relative_bearing"] = round(float(rel), 1)
+        point["screen_x"] = round(float(x), 4)
+        point["scale"] = round(float(scale), 3)
+        points.append(point)
+    return points
+
+@app.route('/navigation-points/visible')
+def get_visible_navigation_points():
+    """
+    Return the points a user can see, see visible() for the fields.
+
+    Takes lat, lng and heading, plus optional fov (degrees, default 120) and
+    max_distance (meters, default 1000).
+    """
+    try:
+        lat, lng, heading = _float_arg('lat'), _float_arg('lng'), _float_arg('heading')
+        fov = _float_arg('fov', 120.0)
+        max_distance = _float_arg('max_distance', 1000.0)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(visible(lat, lng, heading, fov, max_distance, _dataset()))
+
+# Walking routes over a graph joining each point to its nearest neighbours
+# (see routing.RouteGraph), with NAV_ROUTE_LANDMARKS ALT landmarks (0 =
+# plain A*). Building one takes seconds for 100k points, so each dataset's
+# graph is built on a background thread as soon as it's loaded or swapped
+# in, and /route answers 503 until it's ready.
+ROUTE_LANDMARKS = int(os.environ.get('NAV_ROUTE_LANDMARKS', DEFAULT_LANDMARKS))
+ROUTE_RETRY_AFTER = 2  # seconds
+_route_graphs = {}  # dataset version -> RouteGraph, for the newest dataset built
+_route_graph_builds = set()  # dataset versions with a build running
+_route_graph_lock = threading.Lock()
 
-# Create HTML template
-with open('templates/index.html', 'w', encoding='utf-8') as f: # Added encoding='utf-8'
-    f.write("""
+def build_route_graph(dataset):
+    """
+    Start building a dataset's RouteGraph on a background thread, unless
+    it's built or building or the dataset has been swapped out already.
+    """
+    with _route_graph_lock:
+        if (dataset.version != DATASET.version or dataset.version in _route_graphs
+                or dataset.version in _route_graph_builds):
+            return
+        _route_graph_builds.add(dataset.version)
+    threading.Thread(target=_build_route_graph, args=(dataset,), name='route-graph', daemon=True).start()
+
+def _build_route_graph(dataset):
+    global _route_graphs
+    try:
+        graph = RouteGraph(dataset.index.lats, dataset.index.lngs, landmarks=ROUTE_LANDMARKS)
+    except Exception:
+        app.logger.exception("Building the route graph for dataset %s failed", dataset.version)
+        graph = None
+    with _route_graph_lock:
+        _route_graph_builds.discard(dataset.version)
+        # A newer dataset may have been swapped in meanwhile; this graph is
+        # no use then, and the previous one goes once the current one is in
+        if graph is not None and dataset.version == DATASET.version:
+            _route_graphs = {dataset.version: graph}
+
+def route_graph(dataset):
+    """The RouteGraph for a dataset, or None while it's still being built"""
+    with _route_graph_lock:
+        graph = _route_graphs.get(dataset.version)
+    if graph is None:
+        build_route_graph(dataset)  # in case an earlier build failed
+    return graph
+
+build_route_graph(DATASET)
+
+@app.route('/route')
+@cached
+def get_route():
+    """
+    Return the shortest walk between two navigation points.
+
+    Takes the from and to point ids and returns distance_m plus the points
+    along the way, starting with from. 404 if either point doesn't exist or
+    no walk connects them, 503 while the dataset's route graph is still
+    being built.
+    """
+    try:
+        from_id, to_id = _int_arg('from'), _int_arg('to')
+    except ValueError:
+        return jsonify({"error": "Query parameters 'from' and 'to' must be navigation point ids"}), 400
+
+    dataset = _dataset()
+    source, goal = dataset.points.index_of(from_id), dataset.points.index_of(to_id)
+    for point_id, index in ((from_id, source), (to_id, goal)):
+        if index is None:
+            return jsonify({"error": f"No navigation point with id {point_id}"}), 404
+
+    graph = route_graph(dataset)
+    if graph is None:
+        return (jsonify({"error": "Walking routes are still being prepared, try again shortly"}), 503,
+                {'Retry-After': str(ROUTE_RETRY_AFTER)})
+    route = graph.route(source, goal)
+    if route is None:
+        return jsonify({"error": f"No walking route from {from_id} to {to_id}"}), 404
+    return jsonify({
+        "from": from_id,
+        "to": to_id,
+        "distance_m": round(route.distance_m, 1),
+        "points": [dataset.points.point(i) for i in route.path],
+    })
+
+# Live updates. A client creates a session, listens on its event stream with
+# EventSource, and POSTs its position and heading whenever they change. The
+# server pushes only the points that entered or left the client's nearby and
+# visible sets; the client places those few points itself between pushes.
+# Each open stream holds one server thread, so for thousands of clients run
+# the app under an async worker (e.g. gunicorn -k gevent).
+NEARBY_COUNT = 5
+SESSIONS = SessionRegistry()
+
+def push_session_update(session, lat, lng, heading, fov=120.0):
+    """Recompute a session's nearby and visible sets and push what changed"""
+    dataset = _dataset()
+    with session.lock:
+        session.position = (lat, lng, heading, fov)
+        nearby = set(dataset.index.nearest(lat, lng, NEARBY_COUNT, fast=True)[0].tolist())
+        in_view = set(_view_cone(dataset.index, lat, lng, heading, fov)[0].tolist())
+
+        # Indices from another dataset mean nothing in this one
+        reset = session.take_resync() or session.dataset_version != dataset.version
+        session.dataset_version = dataset.version
+        if reset:
+            session.nearby, session.visible = set(), set()
+        event = _session_event(dataset, session.nearby, nearby, session.visible, in_view, reset)
+        session.nearby, session.visible = nearby, in_view
+        if event:
+            # A client too far behind gets the whole state instead of the backlog
+            session.push(event, snapshot=lambda: _session_event(dataset, set(), nearby, set(), in_view, True))
+
+def _session_event(dataset, old_nearby, nearby, old_visible, visible, reset):
+    """Event moving a client from the old nearby/visible sets to the new ones"""
+    event = {"reset": True} if reset else {}
+    for name, old, new in (("nearby", old_nearby, nearby), ("visible", old_visible, visible)):
+        entered, left = diff_ids(old, new)
+        if entered or left:
+            event[name] = {
+                "entered": [dataset.points.point(i) for i in sorted(entered)],
+                "left": [int(dataset.points.ids[i]) for i in sorted(left)],
+            }
+    return event
+
+@app.route('/sessions', methods=['POST'])
+def create_session():
+    """Start a live-update session and return its id"""
+    session = SESSIONS.create()
+    return jsonify({"session_id": session.session_id}), 201
+
+@app.route('/sessions/<session_id>/events')
+def stream_session(session_id):
+    """Server-Sent Events stream of nearby/visible changes for a session"""
+    session = SESSIONS.get(session_id)
+    if session is None:
+        return jsonify({"error": f"No session {session_id}"}), 404
+
+    # A new or reconnecting stream starts from a full snapshot
+    session.request_resync()
+    if session.position is not None:
+        push_session_update(session, *session.position)
+    return Response(session.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/sessions/<session_id>/position', methods=['POST'])
+def update_session_position(session_id):
+    """
+    Report a client's position. Takes a JSON body with lat, lng and heading,
+    plus an optional fov (degrees, default 120).
+    """
+    session = SESSIONS.get(session_id)
+    if session is None:
+        return jsonify({"error": f"No session {session_id}"}), 404
+    data = request.get_json(silent=True) or {}
+    try:
+        lat, lng, heading = (float(data[name]) for name in ('lat', 'lng', 'heading'))
+        fov = float(data.get('fov', 120))
+        if not all(map(math.isfinite, (lat, lng, heading, fov))):
+            raise ValueError
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Body must be JSON with finite numeric lat, lng and heading"}), 400
+
+    push_session_update(session, lat, lng, heading, fov)
+    return '', 204
+
+# Opt-in instrumentation: AR_METRICS=1 records per-route request counts,
+# latency histograms and bytes plus cache hit rates, served at /metrics
+METRICS_REGISTRY = None
+if os.environ.get('AR_METRICS') == '1':
+    METRICS_REGISTRY = Registry()
+    instrument_flask(app, METRICS_REGISTRY, 'ar_api')
+    cache_metrics(METRICS_REGISTRY, 'ar_api', lambda: {'response': RESPONSE_CACHE})
+    METRICS_REGISTRY.register(CallbackMetric(
+        'ar_api_sessions', 'Open live-update sessions.', 'gauge', lambda: [({}, len(SESSIONS))]))
+
+# Opt-in profiling: AR_PROFILE=0.01 samples 1% of requests (0 = only those
+# sent with X-Profile: 1) into collapsed-stack files in AR_PROFILE_DIR
+PROFILER = None
+if os.environ.get('AR_PROFILE'):
+    PROFILER = profile_flask(app, RequestProfiler(
+        sample_rate=float(os.environ['AR_PROFILE']),
+        output_dir=os.environ.get('AR_PROFILE_DIR', 'profiles')))
+
+# Frontend assets. They live here so the whole simulator is one file, and are
+# written out by build_assets() below.
+
+# HTML template
+INDEX_HTML = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -108,11 +484,10 @@ with open('templates/index.html', 'w', encoding='utf-8') as f: # Added encoding=
     <script src="{{ url_for('static', filename='app.js') }}"></script>
 </body>
 </html>
-""")
+"""
 
-# Create CSS file
-with open('static/style.css', 'w', encoding='utf-8') as f:  # Added encoding='utf-8'
-    f.write("""
+# CSS file
+STYLE_CSS = """
 * {
     margin: 0;
     padding: 0;
@@ -348,11 +723,10 @@ body {
         height: 20vh;
     }
 }
-""")
+"""
 
-# Create JavaScript file
-with open('static/app.js', 'w', encoding='utf-8') as f:  # Added encoding='utf-8'
-    f.write("""
+# JavaScript file
+APP_JS = """
 // AR Navigation Simulator
 
 // Main app state
@@ -363,6 +737,14 @@ const state = {
     },
     heading: 0,  // 0 = North, 90 = East, 180 = South, 270 = West
     navigationPoints: [],
+    // Pushed by the server over the session's event stream, keyed by id
+    nearbyPoints: new Map(),
+    visiblePoints: new Map(),
+    sessionId: null,
+    eventSource: null,
+    positionInFlight: false,
+    positionDirty: false,
+    fieldOfView: 120,  // degrees
     movementSpeed: 0.00005,  // approx 5m in latitude degrees
     rotationSpeed: 15  // degrees
 };
@@ -394,17 +776,13 @@ async function init() {
     
     // Fetch navigation points
     await fetchNavigationPoints();
-    
-    // Initial update
-    updateDisplay();
-    updateARScene();
     createMapPoints();
     
-    // Update loop
-    setInterval(() => {
-        updateARScene();
-        updateMapPoints();
-    }, 100);
+    // Nearby and visible points are pushed to us from here on, no polling
+    await openSession();
+    
+    // Initial update (also reports our position to the server)
+    updateDisplay();
     
     // Status message
     statusEl.textContent = 'Ready - Use buttons or arrow keys to move and rotate';
@@ -458,10 +836,16 @@ function updateDisplay() {
     coordinatesEl.textContent = `Position: ${state.position.latitude.toFixed(6)}, ${state.position.longitude.toFixed(6)} (simulated)`;
     
     // Update user marker direction
-    userMarker.querySelector(':after')?.style?.transform = `translateX(-50%) rotate(${state.heading}deg)`;
+    // (pseudo-elements can't be styled from JS, so turn the whole marker)
+    userMarker.style.transform = `translate(-50%, -50%) rotate(${state.heading}deg)`;
     
-    // Update nearby points list
+    // Everything on screen only changes when we move or turn
+    updateMapPoints();
     updateNearbyPointsList();
+    updateARScene();
+    
+    // Let the server work out which points entered or left view
+    sendPosition();
 }
 
 // Get cardinal direction name from heading
@@ -486,41 +870,112 @@ async function fetchNavigationPoints() {
     }
 }
 
+// Open a live-update session and listen for pushed changes
+async function openSession() {
+    if (state.eventSource) {
+        state.eventSource.close();
+    }
+    try {
+        const response = await fetch('/sessions', { method: 'POST' });
+        if (!response.ok) {
+            throw new Error(`HTTP error ${response.status}`);
+        }
+        state.sessionId = (await response.json()).session_id;
+    } catch (error) {
+        console.error('Error opening session:', error);
+        statusEl.textContent = `Error connecting to server: ${error.message}`;
+        return;
+    }
+    
+    const source = new EventSource(`/sessions/${state.sessionId}/events`);
+    source.addEventListener('update', event => applyUpdate(JSON.parse(event.data)));
+    source.addEventListener('error', () => {
+        // EventSource retries on its own unless the session itself is gone
+        if (source.readyState === EventSource.CLOSED && state.eventSource === source) {
+            state.sessionId = null;
+            openSession().then(sendPosition);
+        }
+    });
+    state.eventSource = source;
+}
+
+// Report our position, keeping at most one request in flight
+async function sendPosition() {
+    if (!state.sessionId) {
+        return;
+    }
+    if (state.positionInFlight) {
+        // Send the latest position once the current request finishes
+        state.positionDirty = true;
+        return;
+    }
+    
+    state.positionInFlight = true;
+    try {
+        do {
+            state.positionDirty = false;
+            const response = await fetch(`/sessions/${state.sessionId}/position`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    lat: state.position.latitude,
+                    lng: state.position.longitude,
+                    heading: state.heading,
+                    fov: state.fieldOfView
+                })
+            });
+            if (response.status === 404) {
+                // Session expired, start a new one and resend
+                await openSession();
+                state.positionDirty = state.sessionId !== null;
+            } else if (!response.ok) {
+                throw new Error(`HTTP error ${response.status}`);
+            }
+        } while (state.positionDirty);
+    } catch (error) {
+        console.error('Error sending position:', error);
+    } finally {
+        state.positionInFlight = false;
+    }
+}
+
+// Apply a pushed change to the nearby and visible sets
+function applyUpdate(update) {
+    if (update.reset) {
+        state.nearbyPoints.clear();
+        state.visiblePoints.clear();
+    }
+    applyDiff(state.nearbyPoints, update.nearby);
+    applyDiff(state.visiblePoints, update.visible);
+    
+    updateNearbyPointsList();
+    updateARScene();
+}
+
+function applyDiff(points, diff) {
+    if (!diff) return;
+    diff.left.forEach(id => points.delete(id));
+    diff.entered.forEach(point => points.set(point.id, point));
+}
+
 // Update the list of nearby points in the info panel
 function updateNearbyPointsList() {
-    nearbyPointsEl.innerHTML = '';
-    
     if (state.navigationPoints.length === 0) {
         nearbyPointsEl.innerHTML = '<div class="point-item">No navigation points found.</div>';
         return;
     }
     
-    // Sort points by distance
-    const sortedPoints = [...state.navigationPoints].sort((a, b) => {
-        const distA = calculateDistance(
-            state.position.latitude,
-            state.position.longitude,
-            a.latitude,
-            a.longitude
-        );
-        const distB = calculateDistance(
-            state.position.latitude,
-            state.position.longitude,
-            b.latitude,
-            b.longitude
-        );
-        return distA - distB;
-    });
+    // Only the handful of pushed points, so distances are cheap to redo here
+    const nearestPoints = Array.from(state.nearbyPoints.values(), point => ({
+        point,
+        distance: calculateDistance(
+            state.position.latitude, state.position.longitude,
+            point.latitude, point.longitude
+        )
+    })).sort((a, b) => a.distance - b.distance);
     
-    // Take only closest 5 points
-    sortedPoints.slice(0, 5).forEach(point => {
-        const distance = calculateDistance(
-            state.position.latitude,
-            state.position.longitude,
-            point.latitude,
-            point.longitude
-        );
-        
+    nearbyPointsEl.innerHTML = '';
+    nearestPoints.forEach(({ point, distance }) => {
         const pointEl = document.createElement('div');
         pointEl.className = 'point-item';
         pointEl.innerHTML = `${point.title}: ${distance.toFixed(0)}m`;
@@ -571,56 +1026,45 @@ function updateARScene() {
     // Clear existing markers
     arOverlay.innerHTML = '';
     
-    if (state.navigationPoints.length === 0) {
-        return;
-    }
-    
-    // Place each navigation point in the AR view
-    state.navigationPoints.forEach(point => {
-        // Calculate bearing and distance
+    const halfFov = state.fieldOfView / 2;
+    state.visiblePoints.forEach(point => {
+        const distance = calculateDistance(
+            state.position.latitude, state.position.longitude,
+            point.latitude, point.longitude
+        );
         const bearing = calculateBearing(
-            state.position.latitude,
-            state.position.longitude,
-            point.latitude,
-            point.longitude
+            state.position.latitude, state.position.longitude,
+            point.latitude, point.longitude
         );
         
-        const distance = calculateDistance(
-            state.position.latitude,
-            state.position.longitude,
-            point.latitude,
-            point.longitude
-        );
+        // Relative bearing, -180..180 with 0 straight ahead. We may have
+        // turned since the last push, so check the field of view again.
+        const relativeBearing = ((bearing - state.heading + 540) % 360) - 180;
+        if (Math.abs(relativeBearing) > halfFov) return;
         
-        // Calculate relative bearing (adjust based on where user is facing)
-        const relativeBearing = ((bearing - state.heading) + 360) % 360;
+        // Map the relative bearing to screen coordinates
+        const screenX = arOverlay.offsetWidth / 2 + (relativeBearing / halfFov * arOverlay.offsetWidth / 2);
         
-        // Only show points that are roughly in front of us
-        if (relativeBearing > 300 || relativeBearing < 60) {
-            // Map the bearing to screen coordinates
-            const screenX = arOverlay.offsetWidth / 2 + (((relativeBearing > 180 ? relativeBearing - 360 : relativeBearing) / 60) * arOverlay.offsetWidth / 2);
-            
-            // Vertical position based on distance (closer = lower)
-            const screenY = arOverlay.offsetHeight / 2 + (distance / 100 * arOverlay.offsetHeight / 4);
-            
-            // Create marker element
-            const marker = document.createElement('div');
-            marker.className = 'ar-marker';
-            marker.textContent = `${point.title} (${distance.toFixed(0)}m)`;
-            marker.style.left = `${screenX}px`;
-            marker.style.top = `${screenY}px`;
-            
-            // Scale based on distance (closer = bigger)
-            const scale = Math.max(0.5, Math.min(1.5, 1 - (distance / 500)));
-            marker.style.transform = `translate(-50%, -50%) scale(${scale})`;
-            
-            // Add click event to show details
-            marker.addEventListener('click', () => {
-                alert(`${point.title}: ${point.description}`);
-            });
-            
-            arOverlay.appendChild(marker);
-        }
+        // Vertical position based on distance (closer = lower)
+        const screenY = arOverlay.offsetHeight / 2 + (distance / 100 * arOverlay.offsetHeight / 4);
+        
+        // Scale based on distance (closer = bigger)
+        const scale = Math.max(0.5, Math.min(1.5, 1 - distance / 500));
+        
+        // Create marker element
+        const marker = document.createElement('div');
+        marker.className = 'ar-marker';
+        marker.textContent = `${point.title} (${distance.toFixed(0)}m)`;
+        marker.style.left = `${screenX}px`;
+        marker.style.top = `${screenY}px`;
+        marker.style.transform = `translate(-50%, -50%) scale(${scale})`;
+        
+        // Add click event to show details
+        marker.addEventListener('click', () => {
+            alert(`${point.title}: ${point.description}`);
+        });
+        
+        arOverlay.appendChild(marker);
     });
 }
 
@@ -657,7 +1101,72 @@ function calculateBearing(lat1, lon1, lat2, lon2) {
 
 // Start the application when the page is loaded
 window.addEventListener('load', init);
-""")
+"""
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSETS = {
+    os.path.join('templates', 'index.html'): INDEX_HTML,
+    os.path.join('static', 'style.css'): STYLE_CSS,
+    os.path.join('static', 'app.js'): APP_JS,
+}
+
+# Minified, content-hashed copies of the CSS and JS. The template's
+# url_for('static', ...) calls resolve to these, and as every build gets new
+# names they can be cached forever. Files from older builds are left in
+# place so pages served before a deploy keep working.
+STATIC_MANIFEST, FINGERPRINTED_ASSETS = build_pipeline({'style.css': STYLE_CSS, 'app.js': APP_JS})
+for hashed_path, content in FINGERPRINTED_ASSETS.items():
+    ASSETS[os.path.join('static', *hashed_path.split('/'))] = content
+
+@app.url_defaults
+def use_fingerprinted_static(endpoint, values):
+    """Point url_for('static', filename=...) at the fingerprinted build"""
+    if endpoint == 'static' and values.get('filename') in STATIC_MANIFEST:
+        values['filename'] = STATIC_MANIFEST[values['filename']]
+
+@app.after_request
+def cache_fingerprinted_static(response):
+    """Let browsers keep fingerprinted files for a year without revalidating"""
+    if (request.endpoint == 'static' and response.status_code == 200
+            and request.view_args.get('filename', '').startswith('dist/')):
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+def write_asset(path, content):
+    """
+    Write content to path unless the file already holds exactly that content.
+
+    The comparison is by SHA-256, so an unchanged file keeps its mtime (and
+    browsers keep their cached copy). New content goes to a temp file in the
+    same directory and is renamed into place, so concurrent workers never
+    see a half-written file. Returns True if the file was written.
+    """
+    data = content.encode('utf-8')
+    try:
+        with open(path, 'rb') as f:
+            if hashlib.sha256(f.read()).digest() == hashlib.sha256(data).digest():
+                return False
+    except FileNotFoundError:
+        pass
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with atomic_write(path) as f:
+        f.write(data)
+    return True
+
+def build_assets(base_dir=BASE_DIR):
+    """Write any frontend asset whose content changed, returning the paths written"""
+    written = []
+    for relative_path, content in ASSETS.items():
+        path = os.path.join(base_dir, relative_path)
+        if write_asset(path, content):
+            written.append(path)
+    return written
+
+# Production deployments ship the generated files and set AR_SKIP_ASSET_BUILD=1
+if os.environ.get('AR_SKIP_ASSET_BUILD') != '1':
+    build_assets()
 
 if __name__ == '__main__':
     print("AR Navigation Simulator Created!")
@@ -0,0 +1,100 @@
+# response_cache.py - LRU cache of pre-serialized JSON responses with ETags
+import functools
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+
+from flask import Response, make_response, request
+
+CacheEntry = namedtuple('CacheEntry', ['body', 'etag', 'mimetype'])
+
+
+class ResponseCache:
+    """
+    Bounded, thread-safe LRU mapping a key to encoded response bytes.
+
+    Entries are evicted oldest-first once there are more than max_entries or
+    their bodies add up to more than max_bytes. A body larger than max_bytes
+    is never stored.
+
+    The ETag is a hash of the body, so it's a strong validator and stays the
+    same across restarts and workers as long as the data does.
+    """
+
+    def __init__(self, max_entries=512, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, body, mimetype='application/json'):
+        entry = CacheEntry(body, hashlib.sha1(body).hexdigest(), mimetype)
+        if len(body) > self.max_bytes:
+            return entry
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= len(old.body)
+            self._entries[key] = entry
+            self.nbytes += len(body)
+            while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.nbytes -= len(evicted.body)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+
+def cached_response(cache, version, when=None):
+    """
+    Decorator serving a Flask view from cache.
+
+    The key is version() (the dataset version) plus the request path and
+    query string, so bumping the version makes every old entry unreachable
+    and the LRU ages them out. Only 200 responses are stored. A request whose
+    If-None-Match matches the cached ETag gets an empty 304.
+
+    Pass when, a callable checked against the current request, to skip the
+    cache for requests unlikely to repeat (e.g. arbitrary coordinates) so
+    they don't push out the entries that do.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if when is not None and not when():
+                return view(*args, **kwargs)
+            key = (version(), request.path, tuple(sorted(request.args.items(multi=True))))
+            entry = cache.get(key)
+            if entry is None:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                entry = cache.put(key, response.get_data(), response.mimetype)
+
+            if request.if_none_match.contains(entry.etag):
+                response = Response(status=304)
+            else:
+                response = Response(entry.body, mimetype=entry.mimetype)
+            response.set_etag(entry.etag)
+            return response
+        return wrapper
+    return decorator
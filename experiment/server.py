@@ -1,11 +1,28 @@
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import HTTPServer, SimpleHTTPRequestHandler, HTTPStatus
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import os
 import webbrowser
 import argparse
 import socket
 import mimetypes
+import io
+import itertools
+import selectors
+import re
+import shutil
 import sys
+import signal
+import urllib.parse
+import threading
+import time
 import logging
+from email.utils import parsedate_to_datetime
+
+from asset_cache import AssetCache, negotiate_encoding
+from marker_cache import MarkerCache
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Registry, RequestMetrics, cache_metrics
+from profiling import PROFILE_HEADER, RequestProfiler
 
 # Set up logging
 logging.basicConfig(
@@ -20,6 +37,48 @@ mimetypes.add_type('video/mp4', '.mp4')
 mimetypes.add_type('application/javascript', '.js')
 mimetypes.add_type('text/css', '.css')
 
+# Files at least this big are handed to the kernel with sendfile
+SENDFILE_MIN_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# /marker/<id>.png?size=400&ec=H renders a marker on demand
+MARKER_PATH_RE = re.compile(r'^/marker/([^/]{1,256})\.png$')
+MARKER_SIZE_RANGE = (64, 2000)
+
+def parse_range(header, size):
+    """
+    Parse a single-range Range header against a file size.
+
+    Returns (start, end) inclusive, None if the header should be ignored
+    (bad syntax or several ranges, which we answer with the whole file), or
+    'unsatisfiable' if the range lies outside the file. Every range of an
+    empty file is unsatisfiable.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if size == 0:
+        return 'unsatisfiable'
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            return 'unsatisfiable'
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        return 'unsatisfiable'
+    end = int(last) if last else size - 1
+    return start, min(end, size - 1)
+
 def get_local_ip():
     """Get the local IP address to allow other devices to connect"""
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -34,35 +93,509 @@ def get_local_ip():
     return IP
 
 class ARServer(SimpleHTTPRequestHandler):
+    # (offset, length) of the body copyfile() should send, set by send_head
+    _body_range = None
+    # Whether the current response is for a file we can serve ranges of
+    _accepts_ranges = False
+    # Shared AssetCache for small files, set up by run_server (None = off)
+    asset_cache = None
+    # Shared MarkerCache for /marker/<id>.png
+    marker_cache = MarkerCache()
+    # Registry and RequestMetrics when run with --metrics (None = off)
+    metrics_registry = None
+    request_metrics = None
+    _metrics_start = None
+    # RequestProfiler when run with --profile (None = off)
+    profiler = None
+    _profile_token = None
+
     def log_message(self, format, *args):
         """Override to reduce verbose logging"""
-        if args[0].startswith('GET') and (args[0].endswith('200') or args[0].endswith('304')):
+        # log_request passes (requestline, code, size); errors pass other args
+        if len(args) == 3 and str(args[0]).startswith('GET') and str(args[1]) in ('200', '206', '304'):
             return  # Skip logging successful GET requests
+        if format.startswith('Request timed out'):
+            logger.debug("%s - %s", self.address_string(), format % args)
+            return
         logger.info("%s - %s", self.address_string(), format % args)
 
+    def parse_request(self):
+        # Timing starts once the request line is in, so idle keep-alive
+        # time isn't counted
+        if self.request_metrics is not None:
+            self._metrics_start = time.perf_counter()
+            self._metrics_status = 500
+            self._metrics_bytes = 0
+            self.request_metrics.started()
+        ok = SimpleHTTPRequestHandler.parse_request(self)
+        if ok and self.profiler is not None and self.profiler.should_profile(self.headers.get(PROFILE_HEADER)):
+            self._profile_token = self.profiler.begin(self.metrics_route())
+        return ok
+
+    def handle_one_request(self):
+        # Per-request state, so a keep-alive connection doesn't carry it over
+        self._accepts_ranges = False
+        self._body_range = None
+        try:
+            SimpleHTTPRequestHandler.handle_one_request(self)
+        finally:
+            if self._profile_token is not None:
+                self.profiler.end(self._profile_token)
+                self._profile_token = None
+            if self._metrics_start is not None:
+                self.request_metrics.finished(
+                    self.metrics_route(), self.command or '-', self._metrics_status,
+                    time.perf_counter() - self._metrics_start, self._metrics_bytes)
+                self._metrics_start = None
+
+    def send_response_only(self, code, message=None):
+        self._metrics_status = int(code)
+        SimpleHTTPRequestHandler.send_response_only(self, code, message)
+
+    def send_header(self, keyword, value):
+        if self._metrics_start is not None and keyword.lower() == 'content-length' and self.command != 'HEAD':
+            self._metrics_bytes = int(value)
+        SimpleHTTPRequestHandler.send_header(self, keyword, value)
+
+    def metrics_route(self):
+        """Route label for a request: a fixed template, never the raw path"""
+        path = urllib.parse.urlsplit(getattr(self, 'path', '')).path
+        if MARKER_PATH_RE.match(path):
+            return '/marker/<id>.png'
+        if path in ('/', '/metrics'):
+            return path
+        if path.endswith('/'):
+            return '<dir>/'
+        ext = os.path.splitext(path)[1].lower()
+        # Only known extensions become labels, so odd URLs can't add series
+        return f'*{ext}' if ext in mimetypes.types_map else '*'
+
     def end_headers(self):
         # Add CORS headers to allow camera access and video playback
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'X-Requested-With, Content-type')
+        self.send_header('Access-Control-Allow-Headers', 'X-Requested-With, Content-type, Range')
+        self.send_header('Access-Control-Expose-Headers', 'Content-Range, Accept-Ranges, Content-Length')
+        if self._accepts_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
         SimpleHTTPRequestHandler.end_headers(self)
     
     def do_OPTIONS(self):
         # Handle preflight requests
         self.send_response(200)
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
+    def send_head(self):
+        """
+        Serve GET/HEAD, answering single byte-range requests with 206.
+
+        Range requests for a regular file get 206 Partial Content (or 416 if
+        the range is past the end). Multi-range and malformed Range headers
+        are ignored and the whole file is sent, as RFC 9110 allows. Anything
+        else goes through SimpleHTTPRequestHandler.
+        """
+        self._body_range = None
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == '/metrics' and self.metrics_registry is not None:
+            return self.send_metrics_head()
+        marker_match = MARKER_PATH_RE.match(url.path)
+        if marker_match:
+            return self.send_marker_head(urllib.parse.unquote(marker_match.group(1)), url.query)
+
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and urllib.parse.urlsplit(self.path).path.endswith('/'):
+            # Same index lookup SimpleHTTPRequestHandler does for directories
+            for index in ('index.html', 'index.htm'):
+                if os.path.isfile(os.path.join(path, index)):
+                    path = os.path.join(path, index)
+                    break
+        self._accepts_ranges = os.path.isfile(path)
+        range_header = self.headers.get('Range')
+        if self.asset_cache is not None and self._accepts_ranges and not range_header:
+            asset = self.asset_cache.get(path, self.guess_type(path))
+            if asset is not None:
+                return self.send_cached_head(asset)
+        if not range_header or not self._accepts_ranges:
+            return SimpleHTTPRequestHandler.send_head(self)
+
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self.send_error(HTTPStatus.NOT_FOUND, "File not found")
+            return None
+
+        try:
+            fs = os.fstat(f.fileno())
+            last_modified = self.date_time_string(fs.st_mtime)
+            # If-Range: only honor the range if the client's copy is current
+            if_range = self.headers.get('If-Range')
+            byte_range = parse_range(range_header, fs.st_size)
+            if byte_range is None or (if_range and if_range != last_modified):
+                f.close()
+                return SimpleHTTPRequestHandler.send_head(self)
+
+            if byte_range == 'unsatisfiable':
+                f.close()
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_header('Content-Range', f'bytes */{fs.st_size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+
+            start, end = byte_range
+            self.send_response(HTTPStatus.PARTIAL_CONTENT)
+            self.send_header('Content-type', self.guess_type(path))
+            self.send_header('Content-Range', f'bytes {start}-{end}/{fs.st_size}')
+            self.send_header('Content-Length', str(end - start + 1))
+            self.send_header('Last-Modified', last_modified)
+            self.end_headers()
+            self._body_range = (start, end - start + 1)
+            return f
+        except:
+            f.close()
+            raise
+
+    def send_cached_head(self, asset):
+        """
+        Send headers for a file held in the asset cache.
+
+        Picks the encoding from Accept-Encoding and answers conditional
+        requests with 304. Returns the body as a BytesIO, or None for a 304.
+        """
+        encoding = negotiate_encoding(self.headers.get('Accept-Encoding'), asset.variants)
+        etag = AssetCache.etag(asset, encoding)
+
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match:
+            tags = [tag.strip() for tag in if_none_match.split(',')]
+            not_modified = etag in tags or '*' in tags
+        else:
+            not_modified = False
+            if_modified_since = self.headers.get('If-Modified-Since')
+            if if_modified_since:
+                try:
+                    since = parsedate_to_datetime(if_modified_since).timestamp()
+                    not_modified = asset.mtime_ns // 1_000_000_000 <= since
+                except (TypeError, ValueError, IndexError, OverflowError):
+                    pass
+
+        self.send_response(HTTPStatus.NOT_MODIFIED if not_modified else HTTPStatus.OK)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', asset.last_modified)
+        self.send_header('Vary', 'Accept-Encoding')
+        if not_modified:
+            self.end_headers()
+            return None
+
+        body = asset.variants[encoding]
+        self.send_header('Content-type', asset.content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.end_headers()
+        return io.BytesIO(body)
+
+    def send_marker_head(self, marker_id, query):
+        """
+        Send headers for an on-demand marker image.
+
+        Takes optional size (pixels) and ec (L, M, Q or H) query parameters.
+        Returns the PNG as a BytesIO, or None for errors and 304s.
+        """
+        params = urllib.parse.parse_qs(query)
+        error_correction = params.get('ec', ['H'])[0].upper()
+        try:
+            size = int(params.get('size', ['400'])[0])
+        except ValueError:
+            size = None
+        if size is None or not MARKER_SIZE_RANGE[0] <= size <= MARKER_SIZE_RANGE[1]:
+            self.send_error(HTTPStatus.BAD_REQUEST,
+                            f"size must be between {MARKER_SIZE_RANGE[0]} and {MARKER_SIZE_RANGE[1]}")
+            return None
+        if error_correction not in ('L', 'M', 'Q', 'H'):
+            self.send_error(HTTPStatus.BAD_REQUEST, "ec must be one of L, M, Q, H")
+            return None
+
+        try:
+            marker = self.marker_cache.get(marker_id, size, error_correction)
+        except ImportError as e:
+            self.send_error(HTTPStatus.SERVICE_UNAVAILABLE, f"Marker rendering unavailable: {e}")
+            return None
+
+        if_none_match = self.headers.get('If-None-Match', '')
+        not_modified = marker.etag in [tag.strip() for tag in if_none_match.split(',')]
+        self.send_response(HTTPStatus.NOT_MODIFIED if not_modified else HTTPStatus.OK)
+        self.send_header('ETag', marker.etag)
+        self.send_header('Cache-Control', 'public, max-age=86400')
+        if not_modified:
+            self.end_headers()
+            return None
+        self.send_header('Content-type', 'image/png')
+        self.send_header('Content-Length', str(len(marker.png)))
+        self.end_headers()
+        return io.BytesIO(marker.png)
+
+    def send_metrics_head(self):
+        """Send the metrics registry in Prometheus text format"""
+        body = self.metrics_registry.render().encode('utf-8')
+        self.send_response(HTTPStatus.OK)
+        self.send_header('Content-type', METRICS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'no-store')
+        self.end_headers()
+        return io.BytesIO(body)
+
     def copyfile(self, source, outputfile):
-        """Override copyfile to handle connection resets gracefully"""
+        """
+        Send the response body, handling connection resets gracefully.
+
+        Bodies of at least SENDFILE_MIN_SIZE bytes are sent with
+        socket.sendfile, so the kernel copies straight from the page cache
+        to the socket (os.sendfile where available).
+        """
         try:
-            SimpleHTTPRequestHandler.copyfile(self, source, outputfile)
+            try:
+                fileno = source.fileno()
+            except (AttributeError, io.UnsupportedOperation):
+                fileno = None  # e.g. the BytesIO of a directory listing
+
+            if self._body_range is not None:
+                offset, count = self._body_range
+            elif fileno is not None:
+                offset = source.tell()
+                count = os.fstat(fileno).st_size - offset
+            else:
+                offset = count = 0
+
+            if fileno is not None and count >= SENDFILE_MIN_SIZE:
+                self.connection.sendfile(source, offset, count)
+            elif self._body_range is not None:
+                source.seek(offset)
+                outputfile.write(source.read(count))
+            else:
+                shutil.copyfileobj(source, outputfile)
         except ConnectionResetError:
+            self.close_connection = True
             logger.debug("Connection reset by client - this is normal browser behavior")
         except BrokenPipeError:
+            self.close_connection = True
             logger.debug("Broken pipe - client closed connection")
         except Exception as e:
+            self.close_connection = True
             logger.error(f"Error serving file: {e}")
 
+class KeepAliveARServer(ARServer):
+    """
+    ARServer speaking HTTP/1.1 so phones can reuse connections.
+
+    A worker only serves the requests a connection has already sent. Once
+    nothing more is buffered, handle() returns with idle set and the
+    connection is left open for PooledHTTPServer to watch, so a phone
+    sitting on a keep-alive connection doesn't hold a worker. resume()
+    serves the connection again when it becomes readable.
+    """
+    protocol_version = 'HTTP/1.1'
+    timeout = 5  # seconds a worker waits on a client partway through a request
+    # Headers and body go out in separate writes; without TCP_NODELAY the body
+    # of a small response waits on the client's delayed ACK (~40 ms)
+    disable_nagle_algorithm = True
+    idle = False
+
+    def handle(self):
+        self.idle = False
+        self.close_connection = True
+        self.handle_one_request()
+        while not self.close_connection:
+            if not self._request_buffered():
+                self.idle = True
+                return
+            self.handle_one_request()
+
+    def _request_buffered(self):
+        """Whether more of the next request is already read, without blocking"""
+        self.connection.setblocking(False)
+        try:
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            self.connection.settimeout(self.timeout)
+
+    def finish(self):
+        # An idle connection keeps its buffered reader for the next request
+        if not self.idle:
+            ARServer.finish(self)
+
+    def resume(self):
+        """Serve an idle connection that has become readable"""
+        try:
+            self.handle()
+        finally:
+            self.finish()
+
+    def close_idle(self):
+        """Release the reader and writer of an idle connection before it's closed"""
+        self.idle = False
+        self.finish()
+
+class PooledHTTPServer(HTTPServer):
+    """
+    HTTPServer that serves each connection on a bounded pool of threads.
+
+    When every worker is busy the accept loop waits for one to free up, so
+    extra connections queue in the listen backlog instead of spawning more
+    threads. Keep-alive connections with no request in flight are watched by
+    one selector thread and only go back to the pool once they're readable;
+    they're closed after keep_alive_timeout seconds of silence.
+    server_close() closes the idle connections, stops accepting and then
+    waits for the requests already in progress to finish.
+    """
+    keep_alive_timeout = 15
+
+    def __init__(self, server_address, handler_class, workers=16):
+        HTTPServer.__init__(self, server_address, handler_class)
+        self.workers = workers
+        self._slots = threading.BoundedSemaphore(workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ar-worker')
+        self._idle_lock = threading.Lock()
+        self._parking = []
+        self._closing = False
+        self._waiting_for_slot = False  # selector thread has readable connections but no free worker
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._idle_thread = threading.Thread(target=self._watch_idle, name='ar-idle', daemon=True)
+        self._idle_thread.start()
+
+    def finish_request(self, request, client_address):
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def process_request(self, request, client_address):
+        self._slots.acquire()
+        self._submit(request, client_address)
+
+    def _submit(self, request, client_address, handler=None):
+        try:
+            self._executor.submit(self._process_request_worker, request, client_address, handler)
+        except RuntimeError:
+            # Pool already shut down
+            self._slots.release()
+            self._close(request, handler)
+
+    def _process_request_worker(self, request, client_address, handler=None):
+        parked = False
+        try:
+            if handler is None:
+                handler = self.finish_request(request, client_address)
+            else:
+                handler.resume()
+            parked = getattr(handler, 'idle', False) and self._park(request, handler)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            if not parked:
+                self.shutdown_request(request)
+            self._slots.release()
+            if self._waiting_for_slot:
+                self._wake()
+
+    def _park(self, request, handler):
+        """Hand an idle connection to the selector thread, False if shutting down"""
+        with self._idle_lock:
+            if self._closing:
+                return False
+            self._parking.append((request, handler))
+        self._wake()
+        return True
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except BlockingIOError:
+            pass  # Already has a wakeup pending
+
+    def _close(self, request, handler):
+        if handler is not None:
+            try:
+                handler.close_idle()
+            except OSError:
+                pass
+        self.shutdown_request(request)
+
+    def _watch_idle(self):
+        """Wait for idle connections to become readable, expire or be closed"""
+        selector = selectors.DefaultSelector()
+        selector.register(self._wake_r, selectors.EVENT_READ)
+        deadlines = {}
+        ready = deque()  # readable connections waiting for a free worker
+        while True:
+            with self._idle_lock:
+                parking, self._parking = self._parking, []
+                closing = self._closing
+            if closing:
+                break
+            now = time.monotonic()
+            for request, handler in parking:
+                selector.register(request, selectors.EVENT_READ, handler)
+                deadlines[request] = now + self.keep_alive_timeout
+
+            timeout = max(0.0, min(deadlines.values()) - now) if deadlines else None
+            for key, _ in selector.select(timeout):
+                if key.fileobj is self._wake_r:
+                    try:
+                        while self._wake_r.recv(4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                selector.unregister(key.fileobj)
+                del deadlines[key.fileobj]
+                ready.append((key.fileobj, key.data))
+
+            # Never block on a worker here, or expiry stops while the pool is
+            # saturated; a finishing worker wakes us while anything waits. The
+            # flag goes up before trying so a release in between isn't missed.
+            self._waiting_for_slot = True
+            while ready and self._slots.acquire(blocking=False):
+                request, handler = ready.popleft()
+                self._submit(request, handler.client_address, handler)
+            self._waiting_for_slot = bool(ready)
+
+            now = time.monotonic()
+            for request, deadline in list(deadlines.items()):
+                if deadline <= now:
+                    handler = selector.get_key(request).data
+                    selector.unregister(request)
+                    del deadlines[request]
+                    logger.debug("%s - Keep-alive connection idle for %ss, closing",
+                                 handler.address_string(), self.keep_alive_timeout)
+                    self._close(request, handler)
+
+        for key in list(selector.get_map().values()):
+            if key.fileobj is not self._wake_r:
+                self._close(key.fileobj, key.data)
+        for request, handler in itertools.chain(parking, ready):
+            self._close(request, handler)
+        selector.close()
+
+    def server_close(self):
+        # Idle connections go first so their clients reconnect elsewhere at once
+        with self._idle_lock:
+            self._closing = True
+        self._wake()
+        self._idle_thread.join()
+        self._wake_r.close()
+        self._wake_w.close()
+        HTTPServer.server_close(self)
+        self._executor.shutdown(wait=True)
+
+def create_server(server_address, workers=16):
+    """Create the HTTP server, single-threaded if workers is 0"""
+    if workers <= 0:
+        return HTTPServer(server_address, ARServer)
+    return PooledHTTPServer(server_address, KeepAliveARServer, workers=workers)
+
 def check_requirements():
     """Check if the necessary files exist in the current directory"""
     required_files = ['index.html']
@@ -88,8 +621,32 @@ def check_video_file():
     logger.info(f"Found video files: {', '.join(video_files)}")
     return True
 
-def run_server(port=8000, open_browser=True):
-    """Run the web server to host the AR application"""
+def enable_metrics():
+    """Record request and cache metrics and serve them at /metrics"""
+    registry = Registry()
+    ARServer.request_metrics = RequestMetrics(registry, 'ar_server')
+    cache_metrics(registry, 'ar_server', lambda: {
+        'asset': ARServer.asset_cache,
+        'marker': ARServer.marker_cache,
+    })
+    ARServer.metrics_registry = registry
+    return registry
+
+def run_server(port=8000, open_browser=True, workers=16, asset_cache_mb=32, marker_cache_dir=None,
+               metrics=False, profile_rate=None, profile_dir='profiles', marker_cache_disk_mb=256):
+    """
+    Run the web server to host the AR application.
+
+    With workers > 0 requests are served concurrently by that many threads
+    with HTTP/1.1 keep-alive; workers=0 keeps the old single-threaded server.
+    Files up to 1 MB are served from an in-memory, precompressed cache of at
+    most asset_cache_mb megabytes (0 disables it). Markers rendered for
+    /marker/<id>.png are also kept in marker_cache_dir, if given, up to
+    marker_cache_disk_mb megabytes (least recently used files go first). With
+    metrics=True, request and cache metrics are served at /metrics. With a
+    profile_rate, that fraction of requests (plus any sent with an
+    X-Profile: 1 header) is profiled into flamegraph files in profile_dir.
+    """
     # Check requirements
     requirements_ok = check_requirements()
     video_ok = check_video_file()
@@ -97,6 +654,22 @@ def run_server(port=8000, open_browser=True):
     if not requirements_ok or not video_ok:
         logger.warning("Some requirements are missing. Server will still start, but the application may not work correctly.")
     
+    if asset_cache_mb > 0:
+        ARServer.asset_cache = AssetCache(max_bytes=asset_cache_mb * 1024 * 1024)
+        ARServer.asset_cache.warm(
+            os.getcwd(), lambda path: mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        logger.info(f"Asset cache: {len(ARServer.asset_cache)} files, "
+                    f"{ARServer.asset_cache.nbytes / 1024:.0f} KB with compressed variants")
+    else:
+        ARServer.asset_cache = None
+    ARServer.marker_cache = MarkerCache(cache_dir=marker_cache_dir,
+                                        max_disk_bytes=marker_cache_disk_mb * 1024 * 1024)
+    if metrics:
+        enable_metrics()
+    if profile_rate is not None:
+        ARServer.profiler = RequestProfiler(sample_rate=profile_rate, output_dir=profile_dir)
+        logger.info(f"Profiling {profile_rate:.1%} of requests (and any with {PROFILE_HEADER}: 1) into {profile_dir}/")
+    
     # Try to find an available port if the specified one is in use
     max_port_attempts = 10
     current_port = port
@@ -105,7 +678,7 @@ def run_server(port=8000, open_browser=True):
     for attempt in range(max_port_attempts):
         try:
             server_address = ('', current_port)
-            server = HTTPServer(server_address, ARServer)
+            server = create_server(server_address, workers)
             break
         except OSError as e:
             if e.errno == 98 or e.errno == 10048:  # Port already in use
@@ -140,6 +713,12 @@ def run_server(port=8000, open_browser=True):
     if open_browser:
         webbrowser.open(f"http://localhost:{current_port}")
     
+    # SIGTERM stops the accept loop the same way Ctrl+C does. shutdown() blocks
+    # until serve_forever returns, so it has to run on another thread.
+    def handle_sigterm(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, handle_sigterm)
+    
     try:
         server.serve_forever()
     except KeyboardInterrupt:
@@ -147,13 +726,31 @@ def run_server(port=8000, open_browser=True):
     except Exception as e:
         logger.error(f"Server error: {e}")
     finally:
+        # Waits for in-flight requests when running with a worker pool
         server.server_close()
+        if ARServer.profiler is not None:
+            ARServer.profiler.close()
         print("Server closed.")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Start AR web server')
     parser.add_argument('--port', type=int, default=8000, help='Port to run server on')
     parser.add_argument('--no-browser', action='store_true', help='Don\'t open browser automatically')
+    parser.add_argument('--workers', type=int, default=16,
+                        help='Worker threads for concurrent requests (0 = single-threaded)')
+    parser.add_argument('--asset-cache-mb', type=int, default=32,
+                        help='Memory for cached, precompressed small files (0 = disabled)')
+    parser.add_argument('--marker-cache-dir', default=None,
+                        help='Directory that keeps rendered /marker images across restarts')
+    parser.add_argument('--marker-cache-disk-mb', type=int, default=256,
+                        help='Disk space --marker-cache-dir may use before old markers are deleted')
+    parser.add_argument('--metrics', action='store_true',
+                        help='Serve request and cache metrics at /metrics (Prometheus format)')
+    parser.add_argument('--profile', type=float, default=None, metavar='RATE',
+                        help='Profile this fraction of requests, e.g. 0.01 (0 = only X-Profile: 1 requests)')
+    parser.add_argument('--profile-dir', default='profiles',
+                        help='Where --profile writes collapsed-stack flamegraph files')
     
     args = parser.parse_args()
-    run_server(args.port, not args.no_browser)
\ No newline at end of file
+    run_server(args.port, not args.no_browser, args.workers, args.asset_cache_mb, args.marker_cache_dir,
+               args.metrics, args.profile, args.profile_dir, args.marker_cache_disk_mb)
\ No newline at end of file
@@ -0,0 +1,135 @@
+# sessions.py - Per-client state for pushing navigation updates over SSE
+import json
+import threading
+import time
+import uuid
+from collections import deque
+
+SESSION_IDLE_TIMEOUT = 300  # seconds without a stream or update before a session is dropped
+MAX_QUEUED_EVENTS = 64  # a client this far behind is resynced from scratch
+
+
+class NavigationSession:
+    """
+    One simulator client: its last position, which points it was last told
+    about (as sets of store indices), plus a queue of events waiting to be
+    streamed to it.
+
+    The stream generator blocks on a Condition rather than polling, so an
+    idle session costs nothing but its memory. Hold `lock` while computing
+    and pushing a diff so two updates can't interleave.
+    """
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.lock = threading.Lock()
+        self.position = None
+        self.nearby = set()
+        self.visible = set()
+        self.dataset_version = None  # the dataset those indices refer to
+        self.last_seen = time.monotonic()
+        self.closed = False
+        self._resync = False
+        self._events = deque()
+        self._condition = threading.Condition()
+
+    def push(self, event, snapshot=None):
+        """
+        Queue an event for the stream.
+
+        If the client has fallen MAX_QUEUED_EVENTS behind, the backlog is
+        replaced by one {"reset": true, ...} event from snapshot(), a
+        callable returning the session's full current state, so the client
+        catches up in one step. Without a snapshot the backlog is dropped
+        and the session flagged so the next update is sent in full.
+        """
+        with self._condition:
+            if len(self._events) >= MAX_QUEUED_EVENTS:
+                self._events.clear()
+                if snapshot is not None:
+                    self._events.append(snapshot())
+                else:
+                    self._resync = True
+            else:
+                self._events.append(event)
+            self._condition.notify_all()
+
+    def request_resync(self):
+        """Drop pending events and make the next update a full one"""
+        with self._condition:
+            self._events.clear()
+            self._resync = True
+
+    def take_resync(self):
+        """Return whether the next update must be full, clearing the flag"""
+        with self._condition:
+            resync, self._resync = self._resync, False
+            return resync
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+    def wait_events(self, timeout):
+        """Block until events arrive (or timeout) and return them all"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._events or self.closed, timeout)
+            events = list(self._events)
+            self._events.clear()
+        self.last_seen = time.monotonic()
+        return events
+
+    def stream(self, heartbeat=15.0):
+        """
+        Generate Server-Sent Events for this session until it's closed.
+
+        A comment line goes out every `heartbeat` seconds of silence so
+        proxies keep the connection open and dead clients are noticed.
+        """
+        yield 'retry: 2000\n\n'
+        while not self.closed:
+            events = self.wait_events(heartbeat)
+            if not events:
+                yield ': heartbeat\n\n'
+            for event in events:
+                yield f"event: update\ndata: {json.dumps(event, separators=(',', ':'))}\n\n"
+
+
+class SessionRegistry:
+    """Thread-safe map of session id to NavigationSession with idle expiry"""
+
+    def __init__(self, idle_timeout=SESSION_IDLE_TIMEOUT):
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def create(self):
+        self.reap()
+        session = NavigationSession(uuid.uuid4().hex)
+        with self._lock:
+            self._sessions[session.session_id] = session
+        return session
+
+    def get(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.last_seen = time.monotonic()
+        return session
+
+    def reap(self):
+        """Close and drop sessions that have been idle for too long"""
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            expired = [sid for sid, session in self._sessions.items() if session.last_seen < cutoff]
+            for sid in expired:
+                self._sessions.pop(sid).close()
+        return len(expired)
+
+
+def diff_ids(old_ids, new_ids):
+    """Return (entered, left) id sets between two snapshots"""
+    return new_ids - old_ids, old_ids - new_ids
@@ -0,0 +1,310 @@
+# simulation.py - Many simulated users moving at once, for capacity planning
+import argparse
+import math
+import os
+import statistics
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from geo import EARTH_RADIUS_M
+from poi_generator import generate_nav_points
+
+# Same movement model as the frontend's moveForward/rotateLeft/rotateRight
+MOVEMENT_SPEED = 0.00005  # degrees per step, approx 5m in latitude
+ROTATION_SPEED = 15.0  # degrees per turn
+
+TickResult = namedtuple('TickResult', ['nearest', 'nearest_m', 'visible_users', 'visible_points'])
+
+
+class _CellGrid:
+    """
+    Points bucketed into square cells of cell_m meters on the local plane.
+
+    block(key) returns the positions (into the cell-sorted x/y arrays) of
+    every point within `reach` cells of a cell, so a user in that cell sees
+    every point closer than reach * cell_m.
+    """
+
+    def __init__(self, x, y, cell_m, reach=1):
+        self.cell_m = float(cell_m)
+        self.reach = int(reach)
+        self.radius_m = self.cell_m * self.reach
+        keys = self.keys(x, y)
+        self.order = np.argsort(keys, kind='stable')
+        self.x = x[self.order].astype(np.float32)
+        self.y = y[self.order].astype(np.float32)
+        cells, starts = np.unique(keys[self.order], return_index=True)
+        ends = np.append(starts[1:], len(keys))
+        self.cells = {int(c): (int(s), int(e)) for c, s, e in zip(cells, starts, ends)}
+        self._blocks = {}
+
+    def keys(self, x, y):
+        cx = np.floor(x / self.cell_m).astype(np.int64)
+        cy = np.floor(y / self.cell_m).astype(np.int64)
+        return (cx << 32) + cy + (1 << 31)
+
+    def block(self, key):
+        block = self._blocks.get(key)
+        if block is None:
+            span = range(-self.reach, self.reach + 1)
+            neighbours = (key + (dx << 32) + dy for dx in span for dy in span)
+            slices = [self.cells[k] for k in neighbours if k in self.cells]
+            block = (np.concatenate([np.arange(s, e) for s, e in slices])
+                     if slices else np.empty(0, dtype=np.int64))
+            self._blocks[key] = block
+        return block
+
+    def jobs(self, keys, pairs_per_job=1_000_000):
+        """Split users (by their cell keys) into (users, block) chunks of similar cost"""
+        order = np.argsort(keys, kind='stable')
+        cells, starts = np.unique(keys[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for key, start, end in zip(cells.tolist(), starts.tolist(), ends.tolist()):
+            block = self.block(key)
+            rows = max(1, pairs_per_job // max(len(block), 1))
+            for s in range(start, end, rows):
+                yield order[s:min(s + rows, end)], block
+
+
+class Simulation:
+    """
+    N simulated users kept in NumPy arrays and advanced together.
+
+    Each tick every user may turn by ROTATION_SPEED, then steps forward
+    exactly like moveForward in the browser (latitude += speed * cos(heading),
+    longitude += speed * sin(heading), in degrees). Then the k nearest points
+    and the points in view (the same cone as project.visible) are found for
+    all users in one batch.
+
+    Distances use a local flat projection around `center`. Within ~10 km of
+    the center this agrees with haversine to within a meter at view
+    distance, so only points right on the edge of a view can differ.
+
+    Users only compare against points in nearby grid cells. The view grid
+    has cells of max_distance / 2 and looks two cells out; the nearest grid
+    is sized from the point density so a 3x3 block usually holds about 3k
+    points, and users whose kth neighbour lies beyond it fall back to a
+    search over all points, so results are exact. Chunks of users are
+    processed by a thread pool; NumPy releases the GIL, so this scales with
+    cores.
+    """
+
+    def __init__(self, poi_lats, poi_lngs, n_users, center, spread_m=2000.0, k=5,
+                 fov=120.0, max_distance=1000.0, turn_probability=0.1, seed=0, workers=None):
+        self.center = center
+        self.k = int(k)
+        self.half_fov = max(0.0, min(float(fov), 360.0)) / 2
+        self.max_distance = float(max_distance)
+        self.turn_probability = turn_probability
+        self.workers = workers or os.cpu_count() or 1
+        self.rng = np.random.default_rng(seed)
+        self._executor = None
+        self._lat_scale = math.radians(1) * EARTH_RADIUS_M
+        self._lng_scale = self._lat_scale * math.cos(math.radians(center[0]))
+
+        px, py = self._project(np.asarray(poi_lats, dtype=np.float64), np.asarray(poi_lngs, dtype=np.float64))
+        self.poi_x, self.poi_y = px.astype(np.float32), py.astype(np.float32)
+        self.view_grid = _CellGrid(px, py, self.max_distance / 2, reach=2)
+        if len(px):
+            area = max((np.ptp(px) + 1.0) * (np.ptp(py) + 1.0), 1.0)
+            near_cell = math.sqrt(3 * self.k * area / (math.pi * len(px)))
+        else:
+            near_cell = self.max_distance
+        self.near_grid = _CellGrid(px, py, near_cell, reach=1)
+
+        # Users start uniformly spread over a disk around the center
+        r = spread_m * np.sqrt(self.rng.random(n_users))
+        theta = self.rng.random(n_users) * 2 * np.pi
+        self.lats = center[0] + r * np.cos(theta) / self._lat_scale
+        self.lngs = center[1] + r * np.sin(theta) / self._lng_scale
+        self.headings = self.rng.integers(0, 24, n_users) * ROTATION_SPEED
+        self.speeds = np.full(n_users, MOVEMENT_SPEED)
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _project(self, lats, lngs):
+        """Local flat x (east) / y (north) coordinates in meters"""
+        return (lngs - self.center[1]) * self._lng_scale, (lats - self.center[0]) * self._lat_scale
+
+    def step(self):
+        """Turn some users and move everyone one step forward"""
+        n = len(self)
+        # Half of the turning users go left, half right
+        roll = self.rng.random(n) / self.turn_probability
+        turn = np.where(roll < 0.5, -ROTATION_SPEED, np.where(roll < 1.0, ROTATION_SPEED, 0.0))
+        self.headings = (self.headings + turn) % 360.0
+
+        heading_rad = np.radians(self.headings)
+        self.lats += self.speeds * np.cos(heading_rad)
+        self.lngs += self.speeds * np.sin(heading_rad)
+
+    def query(self):
+        """
+        Find every user's nearest and visible points.
+
+        Returns a TickResult: nearest (n x k point indices, -1 padded) and
+        nearest_m (their distances, nearest first), plus visible_users and
+        visible_points, parallel arrays with one entry per (user, visible
+        point) pair, grouped by cell rather than sorted.
+        """
+        x, y = self._project(self.lats, self.lngs)
+        x, y = x.astype(np.float32), y.astype(np.float32)
+        heading_rad = np.radians(self.headings)
+        self._tick = (x, y, np.sin(heading_rad).astype(np.float32), np.cos(heading_rad).astype(np.float32))
+        nearest = np.full((len(self), self.k), -1, dtype=np.int64)
+        nearest_m = np.full((len(self), self.k), np.inf, dtype=np.float32)
+
+        near_jobs = [(self._nearest_chunk, users, block, nearest, nearest_m)
+                     for users, block in self.near_grid.jobs(self.near_grid.keys(x, y))]
+        view_jobs = [(self._visible_chunk, users, block)
+                     for users, block in self.view_grid.jobs(self.view_grid.keys(x, y))]
+        jobs = near_jobs + view_jobs
+        if self.workers > 1 and len(jobs) > 1:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self.workers)
+            results = list(self._executor.map(lambda job: job[0](*job[1:]), jobs))
+        else:
+            results = [job[0](*job[1:]) for job in jobs]
+        pairs = results[len(near_jobs):]
+
+        # Users whose kth neighbour may lie outside their block search everything
+        far = np.flatnonzero(nearest_m[:, -1] > self.near_grid.radius_m)
+        if len(far):
+            self._nearest_brute(far, nearest, nearest_m)
+
+        # Report original point indices, not cell-sorted positions
+        valid = nearest >= 0
+        nearest[valid] = self.near_grid.order[nearest[valid]]
+        if pairs:
+            visible_users = np.concatenate([u for u, _ in pairs])
+            visible_points = self.view_grid.order[np.concatenate([p for _, p in pairs])]
+        else:
+            visible_users = visible_points = np.empty(0, dtype=np.int64)
+        return TickResult(nearest, nearest_m, visible_users, visible_points)
+
+    def _nearest_chunk(self, users, block, nearest, nearest_m):
+        k = min(self.k, len(block))
+        if not k:
+            return
+        x, y = self._tick[:2]
+        grid = self.near_grid
+        d2 = (grid.x[block][None, :] - x[users][:, None]) ** 2 + (grid.y[block][None, :] - y[users][:, None]) ** 2
+        part, part_d2 = _smallest(d2, k)
+        nearest[users, :k] = block[part]
+        nearest_m[users, :k] = np.sqrt(part_d2)
+
+    def _visible_chunk(self, users, block):
+        # In view: within max_distance and within half_fov of the heading,
+        # i.e. the cosine of the angle to the point is at least cos(half_fov)
+        x, y, sin_h, cos_h = self._tick
+        grid = self.view_grid
+        dx = grid.x[block][None, :] - x[users][:, None]
+        dy = grid.y[block][None, :] - y[users][:, None]
+        d2 = dx * dx + dy * dy
+        dot = dx * sin_h[users][:, None]
+        dot += dy * cos_h[users][:, None]
+        in_view = d2 <= self.max_distance ** 2
+        in_view &= dot >= math.cos(math.radians(self.half_fov)) * np.sqrt(d2)
+        rows, cols = np.divmod(np.flatnonzero(in_view), len(block))
+        return users[rows], block[cols]
+
+    def _nearest_brute(self, users, nearest, nearest_m):
+        k = min(self.k, len(self.poi_x))
+        if not k:
+            return
+        x, y = self._tick[:2]
+        # Brute force works in original point order; store near_grid positions
+        rank = np.empty_like(self.near_grid.order)
+        rank[self.near_grid.order] = np.arange(len(rank))
+        for s in range(0, len(users), 256):
+            chunk = users[s:s + 256]
+            d2 = (self.poi_x[None, :] - x[chunk][:, None]) ** 2 + (self.poi_y[None, :] - y[chunk][:, None]) ** 2
+            part, part_d2 = _smallest(d2, k)
+            nearest[chunk, :k] = rank[part]
+            nearest_m[chunk, :k] = np.sqrt(part_d2)
+
+    def tick(self):
+        self.step()
+        return self.query()
+
+
+def _smallest(d2, k):
+    """Column indices and values of the k smallest entries per row, ascending"""
+    # For narrow rows one full sort beats argpartition plus sorting the k
+    if d2.shape[1] <= 64:
+        part = np.argsort(d2, axis=1)[:, :k]
+        return part, np.take_along_axis(d2, part, axis=1)
+    part = np.argpartition(d2, k - 1, axis=1)[:, :k]
+    part_d2 = np.take_along_axis(d2, part, axis=1)
+    by_distance = np.argsort(part_d2, axis=1)
+    return np.take_along_axis(part, by_distance, axis=1), np.take_along_axis(part_d2, by_distance, axis=1)
+
+
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run(sim, hz, ticks, warmup=3):
+    """
+    Tick the simulation `ticks` times at up to `hz` and return the tick
+    latencies in seconds. A tick that overruns its slot starts the next one
+    late rather than skipping it.
+    """
+    for _ in range(warmup):
+        sim.tick()
+
+    interval = 1.0 / hz if hz else 0.0
+    latencies = []
+    next_tick = time.perf_counter()
+    for _ in range(ticks):
+        start = time.perf_counter()
+        sim.tick()
+        latencies.append(time.perf_counter() - start)
+        next_tick += interval
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            next_tick = time.perf_counter()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Simulate many AR navigation users at once')
+    parser.add_argument('--users', type=int, default=100_000, help='Number of simulated users')
+    parser.add_argument('--points', type=int, default=1000, help='Number of navigation points')
+    parser.add_argument('--radius', type=float, default=5000.0, help='Radius in meters users and points are spread over')
+    parser.add_argument('--hz', type=float, default=10.0, help='Target tick rate (0 = as fast as possible)')
+    parser.add_argument('--ticks', type=int, default=50, help='Ticks to measure')
+    parser.add_argument('--k', type=int, default=5, help='Nearest points per user')
+    parser.add_argument('--fov', type=float, default=120.0, help='Field of view in degrees')
+    parser.add_argument('--max-distance', type=float, default=1000.0, help='View distance in meters')
+    parser.add_argument('--workers', type=int, default=None, help='Query threads (default: CPU count)')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    center = (37.7749, -122.4194)  # San Francisco, like the frontend
+    points = generate_nav_points(args.points, center, args.radius, seed=args.seed)
+    sim = Simulation(points.lats, points.lngs, args.users, center, spread_m=args.radius, k=args.k,
+                     fov=args.fov, max_distance=args.max_distance, seed=args.seed, workers=args.workers)
+
+    result = sim.query()
+    print(f"{args.users} users, {args.points} points, {sim.workers} worker(s); "
+          f"{len(result.visible_users) / max(args.users, 1):.1f} points in view per user")
+
+    latencies = sorted(t * 1000 for t in run(sim, args.hz, args.ticks))
+    budget = 1000.0 / args.hz if args.hz else None
+    print(f"tick latency: mean {statistics.mean(latencies):.1f} ms   "
+          f"p50 {percentile(latencies, 0.5):.1f} ms   p95 {percentile(latencies, 0.95):.1f} ms   "
+          f"max {latencies[-1]:.1f} ms")
+    if budget:
+        overruns = sum(t > budget for t in latencies)
+        print(f"budget {budget:.0f} ms at {args.hz:g} Hz: {overruns}/{len(latencies)} ticks over budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+# spatial.py - Grid bucket index over navigation point coordinates
+import numpy as np
+
+from geo import METERS_PER_DEG_LAT, haversine_m, initial_bearing_deg, equirectangular, degree_span
+
+DEFAULT_CELL_DEG = 0.01  # ~1.1 km of latitude per cell
+
+
+class GridIndex:
+    """
+    Uniform latitude/longitude grid over a fixed set of points.
+
+    Point indices are sorted by cell once at construction, so each occupied
+    cell is a contiguous slice of ``order``. Queries only touch the cells that
+    overlap the search area, which keeps the cost proportional to the number
+    of nearby points instead of the size of the dataset.
+    """
+
+    def __init__(self, lats, lngs, cell_deg=DEFAULT_CELL_DEG):
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lngs = np.asarray(lngs, dtype=np.float64)
+        self.cell_deg = float(cell_deg)
+        self.n_rows = int(np.ceil(180.0 / self.cell_deg)) + 1
+        self.n_cols = int(np.ceil(360.0 / self.cell_deg))
+
+        keys = self._row(self.lats) * self.n_cols + self._col(self.lngs)
+        self.order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[self.order]
+        cells, starts = np.unique(sorted_keys, return_index=True)
+        ends = np.append(starts[1:], len(sorted_keys))
+        self.buckets = {
+            int(cell): (int(start), int(end))
+            for cell, start, end in zip(cells, starts, ends)
+        }
+
+        # Radius of a circle holding one point on average, to size the first nearest() search
+        if len(self.lats):
+            lat_span_m = (np.ptp(self.lats) + self.cell_deg) * METERS_PER_DEG_LAT
+            lng_span_m = (np.ptp(self.lngs) + self.cell_deg) * METERS_PER_DEG_LAT * np.cos(
+                np.radians(min(abs(self.lats.min()), abs(self.lats.max()))))
+            self.spacing_m = float(np.sqrt(lat_span_m * lng_span_m / (np.pi * len(self.lats))))
+        else:
+            self.spacing_m = 0.0
+
+    def __len__(self):
+        return len(self.lats)
+
+    def _row(self, lat):
+        return np.floor((np.asarray(lat) + 90.0) / self.cell_deg).astype(np.int64)
+
+    def _col(self, lng):
+        col = np.floor((np.asarray(lng) + 180.0) / self.cell_deg).astype(np.int64)
+        return col % self.n_cols
+
+    def _candidates(self, min_lat, min_lng, max_lat, max_lng):
+        """Indices of every point in the cells overlapping the box (unfiltered)"""
+        row_lo = int(self._row(max(min_lat, -90.0)))
+        row_hi = int(self._row(min(max_lat, 90.0)))
+        if max_lng - min_lng >= 360.0:
+            col_lo, n_span = 0, self.n_cols
+        else:
+            col_lo = int(self._col(min_lng))
+            n_span = (int(self._col(max_lng)) - col_lo) % self.n_cols + 1
+
+        # A huge box would visit more empty cells than there are buckets
+        if (row_hi - row_lo + 1) * n_span > len(self.buckets):
+            slices = list(self.buckets.values())
+        else:
+            slices = []
+            for row in range(row_lo, row_hi + 1):
+                base = row * self.n_cols
+                for offset in range(n_span):
+                    bucket = self.buckets.get(base + (col_lo + offset) % self.n_cols)
+                    if bucket is not None:
+                        slices.append(bucket)
+
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self.order[start:end] for start, end in slices])
+
+    def query_bbox(self, min_lng, min_lat, max_lng, max_lat):
+        """
+        Return the indices of points inside a bounding box, in index order.
+
+        The box uses GeoJSON ordering. When min_lng > max_lng the box is taken
+        to cross the antimeridian.
+        """
+        crosses = min_lng > max_lng
+        span_max_lng = max_lng + 360.0 if crosses else max_lng
+        idx = self._candidates(min_lat, min_lng, max_lat, span_max_lng)
+
+        lats = self.lats[idx]
+        lngs = self.lngs[idx]
+        in_lat = (lats >= min_lat) & (lats <= max_lat)
+        if crosses:
+            in_lng = (lngs >= min_lng) | (lngs <= max_lng)
+        else:
+            in_lng = (lngs >= min_lng) & (lngs <= max_lng)
+        return np.sort(idx[in_lat & in_lng])
+
+    def query_radius(self, lat, lng, radius_m):
+        """
+        Return (indices, distances_m) of points within radius_m of a location.
+
+        Results are ordered by distance, nearest first.
+        """
+        dlat, dlng = degree_span(lat, radius_m)
+        idx = self._candidates(lat - dlat, lng - dlng, lat + dlat, lng + dlng)
+
+        dist = haversine_m(lat, lng, self.lats[idx], self.lngs[idx])
+        keep = dist <= radius_m
+        idx, dist = idx[keep], dist[keep]
+        order = np.argsort(dist, kind='stable')
+        return idx[order], dist[order]
+
+    def nearest(self, lat, lng, k, fast=False):
+        """
+        Return (indices, distances_m, bearings_deg) of the k nearest points.
+
+        The search starts with a radius that would hold k points at the
+        dataset's average density and doubles it until at least k points lie inside
+        it; every point closer than the radius is in the cells searched, so
+        those k are the true nearest. Only the cells visited are measured
+        and only the k results get a bearing. With fast=True the
+        equirectangular approximation is used instead of haversine (see
+        geo.equirectangular for its error bound).
+        """
+        n = len(self.lats)
+        k = min(int(k), n)
+        if k <= 0:
+            empty = np.empty(0)
+            return empty.astype(np.int64), empty, empty
+
+        radius_m = max(self.spacing_m * np.sqrt(k), 1.0)
+        while True:
+            dlat, dlng = degree_span(lat, radius_m)
+            if dlng >= 360.0 or dlat >= 180.0:
+                idx = np.arange(n)
+            else:
+                idx = self._candidates(lat - dlat, lng - dlng, lat + dlat, lng + dlng)
+            if len(idx) >= k:
+                if fast:
+                    dist = equirectangular(lat, lng, self.lats[idx], self.lngs[idx])[0]
+                else:
+                    dist = haversine_m(lat, lng, self.lats[idx], self.lngs[idx])
+                if len(idx) == n or np.count_nonzero(dist <= radius_m) >= k:
+                    break
+            radius_m *= 2
+
+        if k < len(dist):
+            part = np.argpartition(dist, k - 1)[:k]
+        else:
+            part = np.arange(len(dist))
+        part = part[np.argsort(dist[part], kind='stable')]
+        idx, dist = idx[part], dist[part]
+
+        if fast:
+            bearings = equirectangular(lat, lng, self.lats[idx], self.lngs[idx])[1]
+        else:
+            bearings = initial_bearing_deg(lat, lng, self.lats[idx], self.lngs[idx])
+        return idx, dist, bearings
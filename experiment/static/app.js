@@ -9,6 +9,14 @@ const state = {
     },
     heading: 0,  // 0 = North, 90 = East, 180 = South, 270 = West
     navigationPoints: [],
+    // Pushed by the server over the session's event stream, keyed by id
+    nearbyPoints: new Map(),
+    visiblePoints: new Map(),
+    sessionId: null,
+    eventSource: null,
+    positionInFlight: false,
+    positionDirty: false,
+    fieldOfView: 120,  // degrees
     movementSpeed: 0.00005,  // approx 5m in latitude degrees
     rotationSpeed: 15  // degrees
 };
@@ -40,17 +48,13 @@ async function init() {
     
     // Fetch navigation points
     await fetchNavigationPoints();
-    
-    // Initial update
-    updateDisplay();
-    updateARScene();
     createMapPoints();
     
-    // Update loop
-    setInterval(() => {
-        updateARScene();
-        updateMapPoints();
-    }, 100);
+    // Nearby and visible points are pushed to us from here on, no polling
+    await openSession();
+    
+    // Initial update (also reports our position to the server)
+    updateDisplay();
     
     // Status message
     statusEl.textContent = 'Ready - Use buttons or arrow keys to move and rotate';
@@ -104,10 +108,16 @@ function updateDisplay() {
     coordinatesEl.textContent = `Position: ${state.position.latitude.toFixed(6)}, ${state.position.longitude.toFixed(6)} (simulated)`;
     
     // Update user marker direction
-    userMarker.querySelector(':after')?.style?.transform = `translateX(-50%) rotate(${state.heading}deg)`;
+    // (pseudo-elements can't be styled from JS, so turn the whole marker)
+    userMarker.style.transform = `translate(-50%, -50%) rotate(${state.heading}deg)`;
     
-    // Update nearby points list
+    // Everything on screen only changes when we move or turn
+    updateMapPoints();
     updateNearbyPointsList();
+    updateARScene();
+    
+    // Let the server work out which points entered or left view
+    sendPosition();
 }
 
 // Get cardinal direction name from heading
@@ -132,41 +142,112 @@ async function fetchNavigationPoints() {
     }
 }
 
+// Open a live-update session and listen for pushed changes
+async function openSession() {
+    if (state.eventSource) {
+        state.eventSource.close();
+    }
+    try {
+        const response = await fetch('/sessions', { method: 'POST' });
+        if (!response.ok) {
+            throw new Error(`HTTP error ${response.status}`);
+        }
+        state.sessionId = (await response.json()).session_id;
+    } catch (error) {
+        console.error('Error opening session:', error);
+        statusEl.textContent = `Error connecting to server: ${error.message}`;
+        return;
+    }
+    
+    const source = new EventSource(`/sessions/${state.sessionId}/events`);
+    source.addEventListener('update', event => applyUpdate(JSON.parse(event.data)));
+    source.addEventListener('error', () => {
+        // EventSource retries on its own unless the session itself is gone
+        if (source.readyState === EventSource.CLOSED && state.eventSource === source) {
+            state.sessionId = null;
+            openSession().then(sendPosition);
+        }
+    });
+    state.eventSource = source;
+}
+
+// Report our position, keeping at most one request in flight
+async function sendPosition() {
+    if (!state.sessionId) {
+        return;
+    }
+    if (state.positionInFlight) {
+        // Send the latest position once the current request finishes
+        state.positionDirty = true;
+        return;
+    }
+    
+    state.positionInFlight = true;
+    try {
+        do {
+            state.positionDirty = false;
+            const response = await fetch(`/sessions/${state.sessionId}/position`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({
+                    lat: state.position.latitude,
+                    lng: state.position.longitude,
+                    heading: state.heading,
+                    fov: state.fieldOfView
+                })
+            });
+            if (response.status === 404) {
+                // Session expired, start a new one and resend
+                await openSession();
+                state.positionDirty = state.sessionId !== null;
+            } else if (!response.ok) {
+                throw new Error(`HTTP error ${response.status}`);
+            }
+        } while (state.positionDirty);
+    } catch (error) {
+        console.error('Error sending position:', error);
+    } finally {
+        state.positionInFlight = false;
+    }
+}
+
+// Apply a pushed change to the nearby and visible sets
+function applyUpdate(update) {
+    if (update.reset) {
+        state.nearbyPoints.clear();
+        state.visiblePoints.clear();
+    }
+    applyDiff(state.nearbyPoints, update.nearby);
+    applyDiff(state.visiblePoints, update.visible);
+    
+    updateNearbyPointsList();
+    updateARScene();
+}
+
+function applyDiff(points, diff) {
+    if (!diff) return;
+    diff.left.forEach(id => points.delete(id));
+    diff.entered.forEach(point => points.set(point.id, point));
+}
+
 // Update the list of nearby points in the info panel
 function updateNearbyPointsList() {
-    nearbyPointsEl.innerHTML = '';
-    
     if (state.navigationPoints.length === 0) {
         nearbyPointsEl.innerHTML = '<div class="point-item">No navigation points found.</div>';
         return;
     }
     
-    // Sort points by distance
-    const sortedPoints = [...state.navigationPoints].sort((a, b) => {
-        const distA = calculateDistance(
-            state.position.latitude,
-            state.position.longitude,
-            a.latitude,
-            a.longitude
-        );
-        const distB = calculateDistance(
-            state.position.latitude,
-            state.position.longitude,
-            b.latitude,
-            b.longitude
-        );
-        return distA - distB;
-    });
+    // Only the handful of pushed points, so distances are cheap to redo here
+    const nearestPoints = Array.from(state.nearbyPoints.values(), point => ({
+        point,
+        distance: calculateDistance(
+            state.position.latitude, state.position.longitude,
+            point.latitude, point.longitude
+        )
+    })).sort((a, b) => a.distance - b.distance);
     
-    // Take only closest 5 points
-    sortedPoints.slice(0, 5).forEach(point => {
-        const distance = calculateDistance(
-            state.position.latitude,
-            state.position.longitude,
-            point.latitude,
-            point.longitude
-        );
-        
+    nearbyPointsEl.innerHTML = '';
+    nearestPoints.forEach(({ point, distance }) => {
         const pointEl = document.createElement('div');
         pointEl.className = 'point-item';
         pointEl.innerHTML = `${point.title}: ${distance.toFixed(0)}m`;
@@ -217,56 +298,45 @@ function updateARScene() {
     // Clear existing markers
     arOverlay.innerHTML = '';
     
-    if (state.navigationPoints.length === 0) {
-        return;
-    }
-    
-    // Place each navigation point in the AR view
-    state.navigationPoints.forEach(point => {
-        // Calculate bearing and distance
+    const halfFov = state.fieldOfView / 2;
+    state.visiblePoints.forEach(point => {
+        const distance = calculateDistance(
+            state.position.latitude, state.position.longitude,
+            point.latitude, point.longitude
+        );
         const bearing = calculateBearing(
-            state.position.latitude,
-            state.position.longitude,
-            point.latitude,
-            point.longitude
+            state.position.latitude, state.position.longitude,
+            point.latitude, point.longitude
         );
         
-        const distance = calculateDistance(
-            state.position.latitude,
-            state.position.longitude,
-            point.latitude,
-            point.longitude
-        );
+        // Relative bearing, -180..180 with 0 straight ahead. We may have
+        // turned since the last push, so check the field of view again.
+        const relativeBearing = ((bearing - state.heading + 540) % 360) - 180;
+        if (Math.abs(relativeBearing) > halfFov) return;
         
-        // Calculate relative bearing (adjust based on where user is facing)
-        const relativeBearing = ((bearing - state.heading) + 360) % 360;
+        // Map the relative bearing to screen coordinates
+        const screenX = arOverlay.offsetWidth / 2 + (relativeBearing / halfFov * arOverlay.offsetWidth / 2);
         
-        // Only show points that are roughly in front of us
-        if (relativeBearing > 300 || relativeBearing < 60) {
-            // Map the bearing to screen coordinates
-            const screenX = arOverlay.offsetWidth / 2 + (((relativeBearing > 180 ? relativeBearing - 360 : relativeBearing) / 60) * arOverlay.offsetWidth / 2);
-            
-            // Vertical position based on distance (closer = lower)
-            const screenY = arOverlay.offsetHeight / 2 + (distance / 100 * arOverlay.offsetHeight / 4);
-            
-            // Create marker element
-            const marker = document.createElement('div');
-            marker.className = 'ar-marker';
-            marker.textContent = `${point.title} (${distance.toFixed(0)}m)`;
-            marker.style.left = `${screenX}px`;
-            marker.style.top = `${screenY}px`;
-            
-            // Scale based on distance (closer = bigger)
-            const scale = Math.max(0.5, Math.min(1.5, 1 - (distance / 500)));
-            marker.style.transform = `translate(-50%, -50%) scale(${scale})`;
-            
-            // Add click event to show details
-            marker.addEventListener('click', () => {
-                alert(`${point.title}: ${point.description}`);
-            });
-            
-            arOverlay.appendChild(marker);
-        }
+        // Vertical position based on distance (closer = lower)
+        const screenY = arOverlay.offsetHeight / 2 + (distance / 100 * arOverlay.offsetHeight / 4);
+        
+        // Scale based on distance (closer = bigger)
+        const scale = Math.max(0.5, Math.min(1.5, 1 - distance / 500));
+        
+        // Create marker element
+        const marker = document.createElement('div');
+        marker.className = 'ar-marker';
+        marker.textContent = `${point.title} (${distance.toFixed(0)}m)`;
+        marker.style.left = `${screenX}px`;
+        marker.style.top = `${screenY}px`;
+        marker.style.transform = `translate(-50%, -50%) scale(${scale})`;
+        
+        // Add click event to show details
+        marker.addEventListener('click', () => {
+            alert(`${point.title}: ${point.description}`);
+        });
+        
+        arOverlay.appendChild(marker);
     });
 }
 
@@ -0,0 +1,259 @@
+const state = {
+position: {
+latitude: 37.7749,
+longitude: -122.4194
+},
+heading: 0,
+navigationPoints: [],
+nearbyPoints: new Map(),
+visiblePoints: new Map(),
+sessionId: null,
+eventSource: null,
+positionInFlight: false,
+positionDirty: false,
+fieldOfView: 120,
+movementSpeed: 0.00005,
+rotationSpeed: 15
+};
+const arOverlay = document.getElementById('ar-overlay');
+const statusEl = document.getElementById('status');
+const coordinatesEl = document.getElementById('coordinates');
+const headingEl = document.getElementById('heading');
+const nearbyPointsEl = document.getElementById('nearby-points');
+const compassNeedle = document.getElementById('compass-needle');
+const userMarker = document.getElementById('user-marker');
+const mapEl = document.getElementById('map');
+const rotateLeftBtn = document.getElementById('rotate-left');
+const moveForwardBtn = document.getElementById('move-forward');
+const rotateRightBtn = document.getElementById('rotate-right');
+async function init() {
+rotateLeftBtn.addEventListener('click', rotateLeft);
+moveForwardBtn.addEventListener('click', moveForward);
+rotateRightBtn.addEventListener('click', rotateRight);
+window.addEventListener('keydown', handleKeyDown);
+await fetchNavigationPoints();
+createMapPoints();
+await openSession();
+updateDisplay();
+statusEl.textContent = 'Ready - Use buttons or arrow keys to move and rotate';
+}
+function handleKeyDown(e) {
+if (e.key === 'ArrowLeft') {
+rotateLeft();
+} else if (e.key === 'ArrowRight') {
+rotateRight();
+} else if (e.key === 'ArrowUp') {
+moveForward();
+}
+}
+function rotateLeft() {
+state.heading = (state.heading - state.rotationSpeed + 360) % 360;
+updateDisplay();
+}
+function rotateRight() {
+state.heading = (state.heading + state.rotationSpeed) % 360;
+updateDisplay();
+}
+function moveForward() {
+const headingRad = state.heading * Math.PI / 180;
+state.position.latitude += state.movementSpeed * Math.cos(headingRad);
+state.position.longitude += state.movementSpeed * Math.sin(headingRad);
+updateDisplay();
+}
+function updateDisplay() {
+headingEl.textContent = `Heading: ${state.heading}° (${getCardinalDirection(state.heading)})`;
+compassNeedle.style.transform = `translate(-50%, -100%) rotate(${state.heading}deg)`;
+coordinatesEl.textContent = `Position: ${state.position.latitude.toFixed(6)}, ${state.position.longitude.toFixed(6)} (simulated)`;
+userMarker.style.transform = `translate(-50%, -50%) rotate(${state.heading}deg)`;
+updateMapPoints();
+updateNearbyPointsList();
+updateARScene();
+sendPosition();
+}
+function getCardinalDirection(heading) {
+const directions = ['North', 'Northeast', 'East', 'Southeast', 'South', 'Southwest', 'West', 'Northwest'];
+return directions[Math.round(heading / 45) % 8];
+}
+async function fetchNavigationPoints() {
+try {
+const response = await fetch('/navigation-points');
+if (!response.ok) {
+throw new Error(`HTTP error ${response.status}`);
+}
+state.navigationPoints = await response.json();
+} catch (error) {
+console.error('Error fetching navigation points:', error);
+statusEl.textContent = `Error loading navigation data: ${error.message}`;
+}
+}
+async function openSession() {
+if (state.eventSource) {
+state.eventSource.close();
+}
+try {
+const response = await fetch('/sessions', { method: 'POST' });
+if (!response.ok) {
+throw new Error(`HTTP error ${response.status}`);
+}
+state.sessionId = (await response.json()).session_id;
+} catch (error) {
+console.error('Error opening session:', error);
+statusEl.textContent = `Error connecting to server: ${error.message}`;
+return;
+}
+const source = new EventSource(`/sessions/${state.sessionId}/events`);
+source.addEventListener('update', event => applyUpdate(JSON.parse(event.data)));
+source.addEventListener('error', () => {
+if (source.readyState === EventSource.CLOSED && state.eventSource === source) {
+state.sessionId = null;
+openSession().then(sendPosition);
+}
+});
+state.eventSource = source;
+}
+async function sendPosition() {
+if (!state.sessionId) {
+return;
+}
+if (state.positionInFlight) {
+state.positionDirty = true;
+return;
+}
+state.positionInFlight = true;
+try {
+do {
+state.positionDirty = false;
+const response = await fetch(`/sessions/${state.sessionId}/position`, {
+method: 'POST',
+headers: { 'Content-Type': 'application/json' },
+body: JSON.stringify({
+lat: state.position.latitude,
+lng: state.position.longitude,
+heading: state.heading,
+fov: state.fieldOfView
+})
+});
+if (response.status === 404) {
+await openSession();
+state.positionDirty = state.sessionId !== null;
+} else if (!response.ok) {
+throw new Error(`HTTP error ${response.status}`);
+}
+} while (state.positionDirty);
+} catch (error) {
+console.error('Error sending position:', error);
+} finally {
+state.positionInFlight = false;
+}
+}
+function applyUpdate(update) {
+if (update.reset) {
+state.nearbyPoints.clear();
+state.visiblePoints.clear();
+}
+applyDiff(state.nearbyPoints, update.nearby);
+applyDiff(state.visiblePoints, update.visible);
+updateNearbyPointsList();
+updateARScene();
+}
+function applyDiff(points, diff) {
+if (!diff) return;
+diff.left.forEach(id => points.delete(id));
+diff.entered.forEach(point => points.set(point.id, point));
+}
+function updateNearbyPointsList() {
+if (state.navigationPoints.length === 0) {
+nearbyPointsEl.innerHTML = '<div class="point-item">No navigation points found.</div>';
+return;
+}
+const nearestPoints = Array.from(state.nearbyPoints.values(), point => ({
+point,
+distance: calculateDistance(
+state.position.latitude, state.position.longitude,
+point.latitude, point.longitude
+)
+})).sort((a, b) => a.distance - b.distance);
+nearbyPointsEl.innerHTML = '';
+nearestPoints.forEach(({ point, distance }) => {
+const pointEl = document.createElement('div');
+pointEl.className = 'point-item';
+pointEl.innerHTML = `${point.title}: ${distance.toFixed(0)}m`;
+pointEl.title = point.description;
+nearbyPointsEl.appendChild(pointEl);
+});
+}
+function createMapPoints() {
+state.navigationPoints.forEach((point, index) => {
+const pointEl = document.createElement('div');
+pointEl.className = 'map-point';
+pointEl.id = `map-point-${index}`;
+pointEl.title = `${point.title}: ${point.description}`;
+mapEl.appendChild(pointEl);
+});
+updateMapPoints();
+}
+function updateMapPoints() {
+state.navigationPoints.forEach((point, index) => {
+const pointEl = document.getElementById(`map-point-${index}`);
+if (!pointEl) return;
+const latDiff = point.latitude - state.position.latitude;
+const lngDiff = point.longitude - state.position.longitude;
+const scale = 100000;
+const x = 50 + (lngDiff * scale);
+const y = 50 - (latDiff * scale);
+pointEl.style.left = `${x}%`;
+pointEl.style.top = `${y}%`;
+});
+}
+function updateARScene() {
+arOverlay.innerHTML = '';
+const halfFov = state.fieldOfView / 2;
+state.visiblePoints.forEach(point => {
+const distance = calculateDistance(
+state.position.latitude, state.position.longitude,
+point.latitude, point.longitude
+);
+const bearing = calculateBearing(
+state.position.latitude, state.position.longitude,
+point.latitude, point.longitude
+);
+const relativeBearing = ((bearing - state.heading + 540) % 360) - 180;
+if (Math.abs(relativeBearing) > halfFov) return;
+const screenX = arOverlay.offsetWidth / 2 + (relativeBearing / halfFov * arOverlay.offsetWidth / 2);
+const screenY = arOverlay.offsetHeight / 2 + (distance / 100 * arOverlay.offsetHeight / 4);
+const scale = Math.max(0.5, Math.min(1.5, 1 - distance / 500));
+const marker = document.createElement('div');
+marker.className = 'ar-marker';
+marker.textContent = `${point.title} (${distance.toFixed(0)}m)`;
+marker.style.left = `${screenX}px`;
+marker.style.top = `${screenY}px`;
+marker.style.transform = `translate(-50%, -50%) scale(${scale})`;
+marker.addEventListener('click', () => {
+alert(`${point.title}: ${point.description}`);
+});
+arOverlay.appendChild(marker);
+});
+}
+function calculateDistance(lat1, lon1, lat2, lon2) {
+const R = 6371e3; // Earth's radius in meters
+const φ1 = lat1 * Math.PI / 180;
+const φ2 = lat2 * Math.PI / 180;
+const Δφ = (lat2 - lat1) * Math.PI / 180;
+const Δλ = (lon2 - lon1) * Math.PI / 180;
+const a = Math.sin(Δφ/2) * Math.sin(Δφ/2) +
+Math.cos(φ1) * Math.cos(φ2) *
+Math.sin(Δλ/2) * Math.sin(Δλ/2);
+const c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1-a));
+return R * c;
+}
+function calculateBearing(lat1, lon1, lat2, lon2) {
+const φ1 = lat1 * Math.PI / 180;
+const φ2 = lat2 * Math.PI / 180;
+const Δλ = (lon2 - lon1) * Math.PI / 180;
+const y = Math.sin(Δλ) * Math.cos(φ2);
+const x = Math.cos(φ1) * Math.sin(φ2) -
+Math.sin(φ1) * Math.cos(φ2) * Math.cos(Δλ);
+const θ = Math.atan2(y, x);
+return (θ * 180 / Math.PI + 360) % 360;
+}
+window.addEventListener('load', init);
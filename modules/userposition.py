@@ -1,34 +1,352 @@
+import argparse
+import bisect
+import contextlib
+import csv
+import functools
+import html
+import ipaddress
+import json
+import math
+import os
+import tempfile
+import threading
+import random
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
 import geocoder
 import folium  # Optional: For visualizing the location on a map
 
-def get_user_geo_position():
+# How long a lookup is trusted, and where lookups survive restarts
+DEFAULT_CACHE_TTL = 3600  # seconds
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'userposition.json')
+
+# mkstemp creates files readable only by their owner; files we publish get
+# the usual mode instead (fixed, since reading the umask means setting it)
+FILE_MODE = 0o644
+
+
+@contextlib.contextmanager
+def _atomic_write(path):
+    """Write a UTF-8 temp file next to path, renamed over it only if the block succeeds"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            yield f
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+class GeoCache:
+    """
+    TTL cache of geolocation results, optionally persisted to a JSON file.
+
+    Entries older than ttl seconds are treated as missing. With a path the
+    cache is loaded from disk on creation and written back (atomically, via
+    a temp file) on every put, or only on save() when autosave is off.
+    """
+
+    def __init__(self, ttl=DEFAULT_CACHE_TTL, path=None, autosave=True):
+        self.ttl = ttl
+        self.path = path
+        self.autosave = autosave
+        self._entries = {}  # key -> (timestamp, result)
+        self._lock = threading.Lock()
+        if path:
+            self._load()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None or time.time() - entry[0] > self.ttl:
+            return None
+        return entry[1]
+
+    def put(self, key, result, save=True):
+        """Store a result; save=False defers writing the file (see autosave)"""
+        with self._lock:
+            self._entries[key] = (time.time(), result)
+        if self.autosave and save:
+            self.save()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(stored, dict):
+            return
+        now = time.time()
+        self._entries = {
+            key: tuple(entry)
+            for key, entry in stored.items()
+            if _valid_entry(entry) and now - entry[0] <= self.ttl
+        }
+
+    def save(self):
+        """Write the unexpired entries to the cache file"""
+        if not self.path:
+            return
+        now = time.time()
+        with self._lock:
+            fresh = {key: entry for key, entry in self._entries.items() if now - entry[0] <= self.ttl}
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            os.makedirs(directory, exist_ok=True)
+            with _atomic_write(self.path) as f:
+                json.dump(fresh, f)
+        except OSError as e:
+            print(f"Could not save geolocation cache: {e}")
+
+
+def _valid_entry(entry):
+    """
+    Whether a stored cache entry is a [timestamp, result] pair with numeric
+    coordinates; anything else in the file is dropped and becomes a miss.
+    """
+    if not isinstance(entry, (list, tuple)) or len(entry) != 2:
+        return False
+    timestamp, result = entry
+    if not _is_number(timestamp) or not isinstance(result, dict):
+        return False
+    return _is_number(result.get('latitude')) and _is_number(result.get('longitude'))
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+class GeoProvider:
+    """Something that can turn an IP address into a location"""
+
+    def lookup(self, ip):
+        """
+        Return {'latitude', 'longitude', 'address'} for ip, or None if the
+        provider doesn't know it.
+        """
+        raise NotImplementedError
+
+
+class GeocoderProvider(GeoProvider):
+    """Remote lookups through the geocoder package ('me' = this machine)"""
+
+    def lookup(self, ip):
+        try:
+            g = geocoder.ip(ip)
+            if g.ok:  # Check if the geocoding was successful
+                return {
+                    'latitude': g.lat,
+                    'longitude': g.lng,
+                    'address': g.address
+                }
+            print(f"Error: Geocoding failed. Status: {g.status}")
+        except Exception as e:
+            print(f"An error occurred: {e}")
+        return None
+
+
+class IPRangeProvider(GeoProvider):
+    """
+    Offline lookups from a table of IP ranges.
+
+    Ranges are kept sorted by start address, one table per IP version, and a
+    lookup is a bisect on the starts followed by an end check, so it takes
+    microseconds even for millions of ranges. Ranges must not overlap.
+    """
+
+    def __init__(self, ranges):
+        """ranges: iterable of (start_ip, end_ip, latitude, longitude, address)"""
+        tables = {4: [], 6: []}
+        for start, end, latitude, longitude, address in ranges:
+            start, end = ipaddress.ip_address(start), ipaddress.ip_address(end)
+            tables[start.version].append((int(start), int(end), latitude, longitude, address))
+
+        self._starts, self._rows = {}, {}
+        for version, rows in tables.items():
+            rows.sort(key=lambda row: row[0])
+            self._starts[version] = [row[0] for row in rows]
+            self._rows[version] = rows
+
+    @classmethod
+    def from_csv(cls, path):
+        """
+        Load ranges from a CSV with start_ip, end_ip, latitude, longitude and
+        address columns (a header row is expected).
+        """
+        with open(path, newline='', encoding='utf-8') as f:
+            return cls(
+                (row['start_ip'], row['end_ip'], float(row['latitude']),
+                 float(row['longitude']), row.get('address') or None)
+                for row in csv.DictReader(f)
+            )
+
+    def __len__(self):
+        return sum(len(rows) for rows in self._rows.values())
+
+    def lookup(self, ip):
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return None
+        value = int(address)
+        i = bisect.bisect_right(self._starts[address.version], value) - 1
+        if i < 0:
+            return None
+        start, end, latitude, longitude, name = self._rows[address.version][i]
+        if value > end:
+            return None
+        return {
+            'latitude': latitude,
+            'longitude': longitude,
+            'address': name
+        }
+
+
+_default_cache = None
+_default_remote = GeocoderProvider()
+
+def default_cache():
+    """The process-wide cache, persisted under ~/.cache"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = GeoCache(path=DEFAULT_CACHE_PATH)
+    return _default_cache
+
+def get_user_geo_position(ip='me', cache=None, local_provider=None, remote_provider=None):
     """
     Gets the user's geolocation data (latitude, longitude, address).
 
+    Lookups go through a TTL cache first (the persistent default_cache()
+    unless one is given), then the optional offline local_provider (e.g. an
+    IPRangeProvider), and only then the remote geocoder.
+
+    Args:
+        ip: The IP address to locate, or 'me' for this machine
+        cache: A GeoCache to use instead of the default one
+        local_provider: Optional GeoProvider tried before the remote one
+        remote_provider: GeoProvider for misses (default: geocoder)
+
     Returns:
         A dictionary containing latitude, longitude, and address if successful,
         or None if an error occurs.
     """
-    try:
-        g = geocoder.ip('me')  # Use the user's IP address
-
-        if g.ok:  # Check if the geocoding was successful
-            latitude = g.lat
-            longitude = g.lng
-            address = g.address
-
-            return {
-                'latitude': latitude,
-                'longitude': longitude,
-                'address': address
-            }
-        else:
-            print(f"Error: Geocoding failed. Status: {g.status}")
-            return None
+    cache = cache if cache is not None else default_cache()
+    result = cache.get(ip)
+    if result is not None:
+        return result
 
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return None
+    result = _resolve(ip, local_provider, remote_provider)
+    if result is not None:
+        cache.put(ip, result)
+    return result
+
+def _resolve(ip, local_provider, remote_provider):
+    """Look ip up locally if possible, falling back to the remote provider"""
+    result = None
+    # The local table needs an actual address; 'me' has to go remote
+    if local_provider is not None and ip != 'me':
+        result = local_provider.lookup(ip)
+    if result is None:
+        result = (remote_provider or _default_remote).lookup(ip)
+    return result
+
+
+class SingleFlight:
+    """
+    Collapses concurrent lookups of the same key into one.
+
+    The first caller for a key submits the work; anyone asking for that key
+    while it's still running gets the same Future instead of a second lookup.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def submit(self, executor, key, fn, *args):
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = executor.submit(fn, *args)
+            self._inflight[key] = future
+        # Outside the lock: the callback runs right away if it's already done
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+_lookups_in_flight = SingleFlight()
+
+def geolocate_many(ips, cache=None, local_provider=None, remote_provider=None, max_workers=16,
+                   dedup_window=100_000):
+    """
+    Locate many IP addresses concurrently, yielding (ip, result) as each finishes.
+
+    Input may be any iterable, e.g. a stream of log lines' addresses. An
+    address is skipped if it was among the last dedup_window distinct
+    addresses (an LRU, so memory stays bounded on endless streams; one that
+    comes back after dropping out is yielded again, usually from the cache).
+    Cached results are yielded straight away. The rest are resolved like
+    get_user_geo_position on a pool of max_workers threads, with at most a
+    few batches' worth queued at once so memory stays flat for millions of
+    addresses. Lookups already running for another caller
+    with the same providers are shared rather than repeated. result is None
+    for addresses no provider could locate.
+    """
+    cache = cache if cache is not None else default_cache()
+    seen = OrderedDict()
+    pending = {}
+    max_pending = max_workers * 4
+
+    def finished(done):
+        for future in done:
+            ip = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"An error occurred locating {ip}: {e}")
+                result = None
+            if result is not None:
+                cache.put(ip, result, save=False)
+            yield ip, result
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='geolocate') as executor:
+        try:
+            for ip in ips:
+                if ip in seen:
+                    seen.move_to_end(ip)
+                    continue
+                seen[ip] = None
+                if len(seen) > dedup_window:
+                    seen.popitem(last=False)
+
+                result = cache.get(ip)
+                if result is not None:
+                    yield ip, result
+                    continue
+
+                # Different providers can give different answers, so they're part of the key
+                future = _lookups_in_flight.submit(executor, (ip, local_provider, remote_provider),
+                                                   _resolve, ip, local_provider, remote_provider)
+                pending[future] = ip
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from finished(done)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                yield from finished(done)
+        finally:
+            cache.save()
 
 
 
@@ -64,8 +382,171 @@ def display_location_on_map(latitude, longitude, address=None):
 
 
 
+# Leaflet code that draws the GeoJSON written between the template halves.
+# Each feature is a circle sized by how many locations it stands for.
+_LAYER_SCRIPT = """
+var layer = L.geoJSON(locations, {
+    pointToLayer: function (feature, latlng) {
+        var count = feature.properties.count;
+        return L.circleMarker(latlng, {
+            radius: 5 + 3 * Math.log2(count),
+            color: count > 1 ? '#d35400' : '#2980b9',
+            fillOpacity: 0.6,
+            weight: 1
+        });
+    },
+    onEachFeature: function (feature, layer) {
+        layer.bindTooltip(feature.properties.label);
+    }
+}).addTo(%(map)s);
+if (layer.getLayers().length) {
+    %(map)s.fitBounds(layer.getBounds(), {maxZoom: 15});
+}
+"""
+
+@functools.lru_cache(maxsize=8)
+def _base_map_template(zoom_start=13, tiles='OpenStreetMap'):
+    """
+    Render an empty Folium map once and split it around the data.
+
+    Returns (head, tail): the page up to the start of the GeoJSON literal,
+    and everything after it. Every map reuses the same halves, so Folium and
+    Jinja only run once per process.
+    """
+    base_map = folium.Map(location=[0, 0], zoom_start=zoom_start, tiles=tiles)
+    page = base_map.get_root().render()
+    end = page.rfind('</html>')
+    head = page[:end] + '<script>\nvar locations = '
+    tail = ';\n' + _LAYER_SCRIPT % {'map': base_map.get_name()} + '</script>\n' + page[end:]
+    return head, tail
+
+def _normalize_location(location):
+    """Accept (lat, lng), (lat, lng, address) or a get_user_geo_position() dict"""
+    if isinstance(location, dict):
+        return location['latitude'], location['longitude'], location.get('address')
+    if len(location) > 2:
+        return location[0], location[1], location[2]
+    return location[0], location[1], None
+
+def cluster_locations(locations, cell_deg=None, target_cells=64):
+    """
+    Group locations into grid cells and return one feature per occupied cell.
+
+    Each feature sits at the mean position of its locations and carries their
+    count. Without cell_deg the cell size is chosen so the bounding box spans
+    about target_cells cells along its longer side.
+
+    Returns a list of (latitude, longitude, count, label) tuples.
+    """
+    points = [_normalize_location(location) for location in locations]
+    if not points:
+        return []
+    if cell_deg is None:
+        lats = [lat for lat, _, _ in points]
+        lngs = [lng for _, lng, _ in points]
+        extent = max(max(lats) - min(lats), max(lngs) - min(lngs))
+        cell_deg = max(extent / target_cells, 1e-5)
+
+    cells = {}
+    for lat, lng, address in points:
+        key = (int(lat // cell_deg), int(lng // cell_deg))
+        cell = cells.get(key)
+        if cell is None:
+            cells[key] = [lat, lng, 1, address]
+        else:
+            cell[0] += lat
+            cell[1] += lng
+            cell[2] += 1
+
+    clusters = []
+    for lat_sum, lng_sum, count, address in cells.values():
+        lat, lng = lat_sum / count, lng_sum / count
+        if count > 1:
+            label = f"{count} locations"
+        else:
+            label = f"Latitude: {lat}<br>Longitude: {lng}"
+            if address:
+                label += f"<br>Address: {html.escape(str(address))}"
+        clusters.append((lat, lng, count, label))
+    return clusters
+
+def display_locations_on_map(locations, map_filename="user_location_map.html", cluster=True,
+                             cell_deg=None, chunk_size=1000):
+    """
+    Displays many locations on one map, staying small and fast for 100k+ points.
+
+    Instead of one folium.Marker per location, everything is drawn from a
+    single GeoJSON layer. With cluster=True the locations are first merged
+    into grid cells on the server (see cluster_locations), so the page size
+    depends on the number of cells rather than the number of locations. The
+    page is built from a cached base map template and the GeoJSON is
+    streamed to a temp file in chunks, then renamed over map_filename.
+
+    Args:
+        locations: Iterable of (lat, lng), (lat, lng, address) or location dicts
+        map_filename: Where to write the HTML
+        cluster: Merge nearby locations server-side (default True)
+        cell_deg: Cluster cell size in degrees (default: automatic)
+        chunk_size: Features per write
+
+    Returns:
+        The number of features written.
+    """
+    if cluster:
+        features = cluster_locations(locations, cell_deg)
+    else:
+        features = []
+        for location in locations:
+            lat, lng, address = _normalize_location(location)
+            label = f"Latitude: {lat}<br>Longitude: {lng}"
+            if address:
+                label += f"<br>Address: {html.escape(str(address))}"
+            features.append((lat, lng, 1, label))
+
+    head, tail = _base_map_template()
+    with _atomic_write(map_filename) as f:
+        f.write(head)
+        f.write('{"type": "FeatureCollection", "features": [')
+        for start in range(0, len(features), chunk_size):
+            if start:
+                f.write(',')
+            f.write(','.join(
+                json.dumps({
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [lng, lat]},
+                    "properties": {"count": count, "label": label}
+                }, separators=(',', ':'))
+                for lat, lng, count, label in features[start:start + chunk_size]
+            ))
+        f.write(']}')
+        f.write(tail)
+    return len(features)
+
+def benchmark_map_rendering(sizes=(1000, 10000, 100000), output_dir=None, seed=42):
+    """Print HTML size and render time for random locations at each size"""
+    output_dir = output_dir or tempfile.mkdtemp(prefix='map-bench-')
+    rng = random.Random(seed)
+    print(f"{'points':>8} {'mode':<10} {'features':>9} {'html KB':>9} {'seconds':>8}")
+    for n in sizes:
+        locations = [(37.7749 + rng.gauss(0, 0.05), -122.4194 + rng.gauss(0, 0.05)) for _ in range(n)]
+        for cluster in (True, False):
+            path = os.path.join(output_dir, f"map_{n}_{'cluster' if cluster else 'points'}.html")
+            start = time.perf_counter()
+            features = display_locations_on_map(locations, path, cluster=cluster)
+            elapsed = time.perf_counter() - start
+            print(f"{n:>8} {'cluster' if cluster else 'points':<10} {features:>9} "
+                  f"{os.path.getsize(path) / 1024:>9.0f} {elapsed:>8.3f}")
+    print(f"Maps written to {output_dir}")
+
 def main():
     """Main function to get the user's geolocation and optionally display it."""
+    parser = argparse.ArgumentParser(description="Locate this machine and optionally map it")
+    parser.add_argument('--benchmark-map', action='store_true',
+                        help='Benchmark display_locations_on_map at 1k, 10k and 100k points')
+    args = parser.parse_args()
+    if args.benchmark_map:
+        benchmark_map_rendering()
+        return
 
     geo_data = get_user_geo_position()
 